@@ -1,17 +1,41 @@
+import asyncio
 import json
+import time
+from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import find_dotenv, load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import AIMessage, ChatMessage
 
-from application.backend.chatbot.chatbot_supervisor import graph
+from application.backend.chatbot.chatbot_supervisor import (
+    FINAL_ANSWER_TAG, builder, finish_summary, graph, intent_router, summary_cache,
+)
+from application.backend.chatbot.clients import client_stats
+from application.backend.chatbot.product_query import product_store
+from application.backend.datastore.sessions import SessionStore
 
 load_dotenv(find_dotenv())
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Builds or opens the product database before the first request needs it
+    await asyncio.to_thread(product_store.ensure_ready)
+    # Conversation state of session requests is checkpointed per session_id
+    async with SessionStore.open() as sessions:
+        app.state.sessions = sessions
+        app.state.session_graph = builder.compile(checkpointer=sessions.saver)
+        eviction = asyncio.create_task(sessions.run_eviction())
+        try:
+            yield
+        finally:
+            eviction.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,23 +51,97 @@ def read_root():
     return {"message": "backend is running (ᗒᗨᗕ)/ (ᗒᗨᗕ)/ (ᗒᗨᗕ)/"}
 
 
+@app.get("/stats/clients")
+def clients_stats_api():
+    """HTTP connection pool utilisation and per-model LLM request counters."""
+    return client_stats()
+
+
+@app.get("/stats/router")
+def router_stats_api():
+    """Routing decisions per stage and the LLM routing time the first stage saved."""
+    return intent_router.summary()
+
+
+@app.get("/stats/finish")
+def finish_stats_api():
+    """Count, latency and token cost of final answers per finish strategy."""
+    return finish_summary()
+
+
+@app.get("/stats/sessions")
+def sessions_stats_api():
+    """Session turns, pruned checkpoints, evicted sessions and summary cache hits."""
+    return {**app.state.sessions.stats, "summary_cache": dict(summary_cache.stats)}
+
+
+def payload_problem(payload):
+    """Why a /chat_stream body cannot be answered, or None when it is well formed."""
+    if payload.get("session_id"):
+        if not isinstance(payload.get("message"), str) or not payload["message"].strip():
+            return "a session request needs a non-empty 'message'"
+        return None
+    conversation = payload.get("conversation")
+    if not isinstance(conversation, list) or not conversation:
+        return "send either 'session_id' and 'message', or a non-empty 'conversation' list"
+    for item in conversation:
+        if not (isinstance(item, dict) and isinstance(item.get("sender"), str)
+                and isinstance(item.get("content"), str)):
+            return "every 'conversation' item needs a 'sender' and a 'content' string"
+    return None
+
+
 @app.post("/chat_stream")
 async def chat_stream_api(payload: dict):
-    conversation_data = payload["conversation"]
-
-    messages = []
-    for item in conversation_data:
-        if item["sender"] == "user":
-            messages.append(ChatMessage(content=item["content"], role=item["sender"]))
-        elif item["sender"] == "assistant":
-            messages.append(AIMessage(content=item["content"]))
+    """
+    Answer one user message as a server-sent event stream.
+
+    With {"session_id", "message"} the conversation so far is restored from
+    the session's checkpoint and only the new message is added. A payload
+    with the whole "conversation" list and no session_id is answered
+    statelessly. A malformed body is answered with 422 before streaming starts.
+    """
+    problem = payload_problem(payload)
+    if problem:
+        raise HTTPException(status_code=422, detail=problem)
+    session_id = payload.get("session_id")
+    if session_id:
+        sessions = app.state.sessions
+        run_graph = app.state.session_graph
+        config = sessions.config(session_id)
+        messages = [ChatMessage(content=payload["message"], role="user")]
+        await sessions.touch(session_id)
+    else:
+        sessions = None
+        run_graph = graph
+        config = None
+        messages = []
+        for item in payload["conversation"]:
+            if item["sender"] == "user":
+                messages.append(ChatMessage(content=item["content"], role=item["sender"]))
+            elif item["sender"] == "assistant":
+                messages.append(AIMessage(content=item["content"]))
 
     answer = ""
+    started_at = time.perf_counter()
+    first_token_at = None
+    finish_metrics = None
 
     async def event_generator(messages=None):
-        nonlocal answer
+        nonlocal answer, first_token_at, finish_metrics
         try:
-            for chunk in graph.stream({"messages": messages}):
+            async for mode, chunk in run_graph.astream({"messages": messages}, config,
+                                                       stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    # Token chunks of the final synthesis; other model calls are not streamed
+                    message_chunk, metadata = chunk
+                    if FINAL_ANSWER_TAG in metadata.get("tags", []) and message_chunk.content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        data = json.dumps({"type": "delta", "data": message_chunk.content})
+                        yield f"data: {data}\n\n"
+                    continue
+
                 for key, value in chunk.items():
                     if isinstance(value, dict) and "messages" in value:
                         conversation_messages = value["messages"]
@@ -65,6 +163,11 @@ async def chat_stream_api(payload: dict):
                         if conversation_messages and isinstance(conversation_messages[-1], AIMessage):
                             current_content = conversation_messages[-1].content
                             answer = current_content
+                            if conversation_messages[-1].name == "supervisor":
+                                finish_metrics = conversation_messages[-1].model_extra.get("finish")
+                                # Answers that were not streamed arrive whole
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
 
         except Exception as e:
             error_data = json.dumps({"error": str(e)})
@@ -73,10 +176,17 @@ async def chat_stream_api(payload: dict):
     async def final_response_generator(messages=None):
         async for chunk in event_generator(messages):
             yield chunk
+        if sessions is not None:
+            await sessions.prune(session_id)
 
+        total_ms = (time.perf_counter() - started_at) * 1000
+        ttft_ms = None if first_token_at is None else (first_token_at - started_at) * 1000
+        ttft_text = "n/a" if ttft_ms is None else f"{ttft_ms:.0f} ms"
+        print(f"chat_stream: time to first token {ttft_text}, total {total_ms:.0f} ms")
         final_data = json.dumps({
             "type": "final",
-            "data": answer
+            "data": answer,
+            "metrics": {"ttft_ms": ttft_ms, "total_ms": total_ms, "finish": finish_metrics},
         })
         yield f"data: {final_data}\n\n"
 
@@ -0,0 +1,81 @@
+"""
+Check that concurrent /chat_stream requests do not block each other.
+
+Sends one request, then N at once, to the FastAPI app in-process (through
+httpx's ASGI transport, so no server is needed) and reports each stream's
+latency and the wall-clock time of the batch. On a non-blocking request path
+the batch takes roughly as long as its slowest stream rather than the sum of
+all of them.
+
+The full graph runs, so OPENAI_API_KEY and the Cosmos settings are needed.
+The same check runs without network access, against a fake model backend, in
+application/backend/tests/test_chat_stream.py.
+
+    python -m application.backend.benchmarks.concurrent_streams [-n 8] [--question "..."]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from application.backend.api.api import app
+
+DEFAULT_QUESTION = "What are the core, operating frequency and application of M032LG8AE?"
+
+
+async def run_stream(client, question):
+    """
+    Consume one SSE response.
+
+    Returns:
+        tuple: (latency in seconds, server-reported time to first answer
+        token in ms or None, final answer). httpx's ASGI transport delivers
+        the body in one piece, so the first token is timed by the server.
+    """
+    payload = {"conversation": [{"sender": "user", "content": question}]}
+    start = time.perf_counter()
+    first_token = None
+    answer = None
+    async with client.stream("POST", "/chat_stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("type") == "final":
+                answer = event["data"]
+                first_token = event.get("metrics", {}).get("ttft_ms")
+    return time.perf_counter() - start, first_token, answer
+
+
+async def main(concurrency, question):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        # Warm-up request: loads the product database and the vector index
+        await run_stream(client, question)
+
+        single, first_token, _ = await run_stream(client, question)
+        first_token_text = "n/a" if first_token is None else f"{first_token / 1000:.2f} s"
+        print(f"1 stream: {single:.2f} s, first answer token after {first_token_text}")
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_stream(client, question) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _, _ in results)
+    print(f"{concurrency} concurrent streams: wall {wall:.2f} s, "
+          f"per stream min {latencies[0]:.2f} s / median {latencies[len(latencies) // 2]:.2f} s / "
+          f"max {latencies[-1]:.2f} s")
+    print(f"wall / single = {wall / single:.2f} (1.0 is fully concurrent, {concurrency} is fully serialized)")
+    missing = sum(1 for _, _, answer in results if not answer)
+    if missing:
+        print(f"{missing} stream(s) ended without a final answer")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--concurrency", type=int, default=8)
+    parser.add_argument("--question", default=DEFAULT_QUESTION)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.question))
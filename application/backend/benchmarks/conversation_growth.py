@@ -0,0 +1,130 @@
+"""
+Measure supervisor prompt size and conversation state as a conversation grows.
+
+Simulates a conversation turn by turn. Each turn adds a user question, the
+supervisor's instruction, the sub-agent's answer and the final answer. For
+every turn count it reports the routing prompt tokens and the state size
+two ways:
+
+- unbounded: what the graph used to keep, i.e. every message plus the
+  sub-agent's tool call and JSON tool output, all shown to the router;
+- bounded: only the sub-agent answers are kept, older turns are compacted
+  into the rolling summary, and the prompt is windowed.
+
+Without --llm the summary is a stub trimmed to the summary prompt's length
+limit and only the conversation helpers are imported, so neither OPENAI_API_KEY
+nor Cosmos DB is needed; with --llm it is written by the summary model, which
+loads the supervisor and needs its settings.
+
+    python -m application.backend.benchmarks.conversation_growth [--turns 40] [--llm]
+"""
+import argparse
+import asyncio
+import json
+import uuid
+
+import tiktoken
+from langchain_core.messages import AIMessage, ChatMessage, HumanMessage, ToolMessage
+
+from application.backend.chatbot.conversation import conversation_window, message_line, messages_to_compact
+from application.backend.chatbot.prompts import supervisor_prompt
+
+QUESTIONS = [
+    "Recommend 5 Cortex-M23 chips for automotive applications",
+    "Which of those has the most flash?",
+    "What are the core, operating frequency and application of M032LG8AE?",
+    "How do I add these products to my PrestaShop store?",
+    "Do any of them support CAN FD?",
+    "How do I set up shipping for the EU?",
+]
+ANSWER = ("Here are the matching products:\n\n| Part No | Core | Frequency | Flash | SRAM |\n|---|---|---|---|---|\n"
+          + "".join(f"| M2351KIAAE{i} | Arm Cortex-M23 | 64 MHz | 512 KB | 96 KB |\n" for i in range(5))
+          + "\nAll of them are qualified for automotive use. Narrow the search by package type or GPIO count.")
+TOOL_OUTPUT = json.dumps({"columns": ["Part_No", "Core", "Operating_Frequency", "Application"],
+                          "rows": [[f"M2351KIAAE{i}", "Arm Cortex-M23", 64, "Automotive"] for i in range(50)],
+                          "row_count": 50, "truncated": True})
+SUMMARY_WORDS = 200
+
+
+def message(cls, content, **kwargs):
+    return cls(content=content, id=str(uuid.uuid4()), **kwargs)
+
+
+def turn_messages(number, with_tools):
+    question = QUESTIONS[number % len(QUESTIONS)]
+    messages = [
+        message(ChatMessage, question, role="user"),
+        message(HumanMessage, f"Find the products for: {question}", name="supervisor_instructions"),
+    ]
+    if with_tools:
+        messages += [
+            message(AIMessage, "", tool_calls=[{"name": "product_query_tool", "args": {}, "id": f"call{number}"}]),
+            message(ToolMessage, TOOL_OUTPUT, tool_call_id=f"call{number}"),
+        ]
+    messages += [message(AIMessage, ANSWER, name="product_selection_agent"),
+                 message(AIMessage, ANSWER, name="supervisor")]
+    return messages
+
+
+async def stub_summary(summary, messages):
+    words = (summary + " " + "".join(message_line(msg) for msg in messages)).split()
+    return " ".join(words[-SUMMARY_WORDS:])
+
+
+def routing_prompt(messages, summary=""):
+    """The supervisor's routing prompt, laid out as in chatbot_supervisor.routing_prompt()."""
+    return (
+        "SYSTEM PROMPT:\n"
+        f"{supervisor_prompt}\n\n"
+        "CONVERSATION:\n"
+        f"{conversation_window(messages, summary)}\n\n"
+        "END OF CONVERSATION.\n"
+    )
+
+
+def unbounded_prompt(messages):
+    conversation_text = "".join(message_line(msg) for msg in messages)
+    return routing_prompt([]).replace("CONVERSATION:\n", f"CONVERSATION:\n{conversation_text}", 1)
+
+
+async def main(turns, use_llm):
+    encoding = tiktoken.get_encoding("cl100k_base")
+    summarize = stub_summary
+    if use_llm:
+        # Importing the supervisor builds its clients and data stores
+        from application.backend.chatbot.chatbot_supervisor import summarize_turns
+        summarize = summarize_turns
+    unbounded = []
+    bounded = []
+    summary = ""
+    print(f"{'turn':>5} {'prompt (unbounded)':>19} {'prompt (bounded)':>17} "
+          f"{'state msgs':>11} {'state chars (unbounded / bounded)':>34}")
+    for number in range(turns):
+        new = turn_messages(number, with_tools=True)
+        unbounded += new
+        bounded += [msg for msg in new if not isinstance(msg, ToolMessage) and not getattr(msg, "tool_calls", None)]
+
+        # The routing prompt of this turn sees everything up to the user's question
+        current = bounded[:len(bounded) - 3]
+        compacted = messages_to_compact(current)
+        if compacted:
+            summary = await summarize(summary, compacted)
+            removed = {msg.id for msg in compacted}
+            bounded = [msg for msg in bounded if msg.id not in removed]
+            current = [msg for msg in current if msg.id not in removed]
+
+        full_tokens = len(encoding.encode(unbounded_prompt(unbounded[:len(unbounded) - 5])))
+        window_tokens = len(encoding.encode(routing_prompt(current, summary)))
+        unbounded_chars = sum(len(str(msg.content)) for msg in unbounded)
+        bounded_chars = sum(len(str(msg.content)) for msg in bounded) + len(summary)
+        if number + 1 in (1, 2, 5) or (number + 1) % 10 == 0:
+            print(f"{number + 1:>5} {full_tokens:>19} {window_tokens:>17} "
+                  f"{len(unbounded):>5} / {len(bounded):<4} {unbounded_chars:>16} / {bounded_chars:<16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--llm", action="store_true", help="summarise with the summary model instead of a stub")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.llm))
@@ -0,0 +1,69 @@
+"""
+Compare the latency and token cost of the finish strategies.
+
+Runs the supervisor graph once per question to collect the sub-agent answers,
+then produces the final answer from that same state with each strategy
+(passthrough, merge, and synthesize with every --model given) and reports
+the mean latency and tokens per strategy.
+
+The full graph runs, so OPENAI_API_KEY and the Cosmos settings are needed.
+
+    python -m application.backend.benchmarks.finish_strategies [--model o1-mini --model gpt-4o] [-r 3]
+"""
+import argparse
+import asyncio
+
+from langchain_core.messages import AIMessage, ChatMessage
+
+from application.backend.chatbot.chatbot_supervisor import graph, produce_final_answer
+from application.backend.chatbot.clients import get_chat_model
+
+QUESTIONS = [
+    "What are the core, operating frequency and application of M032LG8AE?",
+    "Recommend 5 Cortex-M23 chips for automotive applications",
+    "How do I add a new product to my PrestaShop store?",
+    "I'm looking for 5 products for automotive applications with a Cortex-M23 chip, "
+    "and also I'd like to know how to add them to my e-commerce site.",
+]
+
+
+async def turn_state(question):
+    """Conversation state of one answered turn, without its final answer."""
+    state = await graph.ainvoke({"messages": [ChatMessage(content=question, role="user")]})
+    messages = state["messages"]
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].name == "supervisor":
+        messages = messages[:-1]
+    return messages
+
+
+async def main(models, repeat):
+    variants = [("passthrough", None, "passthrough"), ("merge", None, "merge")]
+    variants += [(f"synthesize ({name})", get_chat_model(name, stream_usage=True), "synthesize") for name in models]
+    totals = {label: {"runs": 0, "ms": 0.0, "input_tokens": 0, "output_tokens": 0} for label, _, _ in variants}
+
+    for question in QUESTIONS:
+        messages = await turn_state(question)
+        print(f"\n{question[:80]}")
+        for label, llm, strategy in variants:
+            for _ in range(repeat):
+                answer, metrics = await produce_final_answer(messages, llm, strategy)
+                total = totals[label]
+                total["runs"] += 1
+                total["ms"] += metrics["ms"]
+                total["input_tokens"] += metrics["input_tokens"]
+                total["output_tokens"] += metrics["output_tokens"]
+            print(f"  {label:<24} {metrics['strategy']:<12} {metrics['ms']:>8.0f} ms  {len(answer):>6} chars")
+
+    print(f"\n{'strategy':<24} {'mean ms':>9} {'in tokens':>10} {'out tokens':>11}")
+    for label, total in totals.items():
+        runs = total["runs"]
+        print(f"{label:<24} {total['ms'] / runs:>9.0f} {total['input_tokens'] / runs:>10.0f} "
+              f"{total['output_tokens'] / runs:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", action="append", help="model for the synthesize strategy (repeatable)")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="runs per strategy and question")
+    args = parser.parse_args()
+    asyncio.run(main(args.model or ["o1-mini", "gpt-4o"], args.repeat))
@@ -0,0 +1,72 @@
+"""
+Measure how much sub-agent fan-out saves on multi-domain questions.
+
+Runs the supervisor graph on a compound question and times every node run
+from the graph's debug stream. Sub-agents the supervisor starts from one
+routing decision run in the same step; the report compares the step's
+wall-clock time with the sum of its branches, which is what running them one
+after the other would have cost.
+
+The full graph runs, so OPENAI_API_KEY and the Cosmos settings are needed.
+
+    python -m application.backend.benchmarks.parallel_fanout [--question "..."]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from langchain_core.messages import ChatMessage
+
+from application.backend.chatbot.chatbot_supervisor import graph
+
+DEFAULT_QUESTION = ("I'm looking for 5 products for automotive applications with a Cortex-M23 chip, "
+                    "and also I'd like to know how to add them to my e-commerce site.")
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+async def run(question):
+    """
+    Run the graph once.
+
+    Returns:
+        tuple: (wall-clock seconds, list of steps, each a list of
+        (node name, seconds) for the node runs in that step).
+    """
+    started = {}
+    steps = {}
+    start = time.perf_counter()
+    state = {"messages": [ChatMessage(content=question, role="user")]}
+    async for event in graph.astream(state, stream_mode="debug"):
+        payload = event["payload"]
+        if event["type"] == "task":
+            started[payload["id"]] = parse_timestamp(event["timestamp"])
+        elif event["type"] == "task_result" and payload["id"] in started:
+            duration = parse_timestamp(event["timestamp"]) - started[payload["id"]]
+            steps.setdefault(event["step"], []).append((payload["name"], duration))
+    return time.perf_counter() - start, [steps[step] for step in sorted(steps)]
+
+
+async def main(question):
+    wall, steps = await run(question)
+    saved = 0.0
+    for number, nodes in enumerate(steps, start=1):
+        step_wall = max(duration for _, duration in nodes)
+        step_sum = sum(duration for _, duration in nodes)
+        saved += step_sum - step_wall
+        names = ", ".join(f"{name} {duration:.2f} s" for name, duration in nodes)
+        print(f"step {number}: {names}")
+        if len(nodes) > 1:
+            print(f"    parallel: {step_wall:.2f} s instead of {step_sum:.2f} s sequential")
+    print(f"\nend to end {wall:.2f} s; fan-out saved {saved:.2f} s "
+          f"(sequential estimate {wall + saved:.2f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--question", default=DEFAULT_QUESTION)
+    args = parser.parse_args()
+    asyncio.run(main(args.question))
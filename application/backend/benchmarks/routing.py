@@ -0,0 +1,94 @@
+"""
+Measure how often the first-stage router decides without the LLM router.
+
+Routes a fixed set of labelled questions through the rules and the
+nearest-centroid stage and reports, per stage, how many questions it decided,
+how many of those match the label, and how long it took. With --llm, every
+question is also routed by the gpt-4o router to compare its latency and agree
+on the questions the first stage left open.
+
+Needs OPENAI_API_KEY (embeddings for the centroid stage, and --llm).
+
+    python -m application.backend.benchmarks.routing [--llm]
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import ChatMessage
+
+from application.backend.chatbot.chatbot_supervisor import intent_router, llm_route
+from application.backend.chatbot.intent_router import ECOMMERCE_AGENT, FINISH, PRODUCT_AGENT
+
+BOTH = "both"
+# (question, expected route); "both" needs a task for each agent
+QUESTIONS = [
+    ("What are the core, operating frequency and application of M032LG8AE?", PRODUCT_AGENT),
+    ("Recommend a Cortex-M23 chip with TrustZone", PRODUCT_AGENT),
+    ("Which products support CAN FD and run above 100 MHz?", PRODUCT_AGENT),
+    ("I need something for a smart meter that sleeps most of the time", PRODUCT_AGENT),
+    ("Which parts would you suggest for a motor drive?", PRODUCT_AGENT),
+    ("How many UARTs does the M2351 series have?", PRODUCT_AGENT),
+    ("How do I add a product to my shop?", ECOMMERCE_AGENT),
+    ("How do I set up free shipping over 50 euros in PrestaShop?", ECOMMERCE_AGENT),
+    ("Customers cannot log in after the last update, what should I check?", ECOMMERCE_AGENT),
+    ("How can I translate the front office into German?", ECOMMERCE_AGENT),
+    ("Where do I change the tax rules for EU buyers?", ECOMMERCE_AGENT),
+    ("Hi there!", FINISH),
+    ("Thank you, that helps a lot", FINISH),
+    ("I'm looking for 5 products for automotive applications with a Cortex-M23 chip, "
+     "and also I'd like to know how to add them to my e-commerce site.", BOTH),
+    ("List M031 chips with USB and tell me how to import them into the catalog", BOTH),
+]
+
+
+def route_label(output):
+    if output["next"] == FINISH or not output["tasks"]:
+        return FINISH
+    agents = {task["agent"] for task in output["tasks"]}
+    return BOTH if len(agents) > 1 else agents.pop()
+
+
+async def main(use_llm):
+    stages = {}
+    llm_seconds = []
+    llm_correct = 0
+    print(f"{'stage':>9} {'route':>24} {'ms':>8}  question")
+    for question, expected in QUESTIONS:
+        start = time.perf_counter()
+        decision = intent_router.route(question)
+        elapsed = (time.perf_counter() - start) * 1000
+        stage, route = ("llm", None) if decision is None else (decision[1], decision[0])
+        stats = stages.setdefault(stage, {"decided": 0, "correct": 0, "ms": 0.0})
+        stats["decided"] += 1
+        stats["correct"] += route == expected
+        stats["ms"] += elapsed
+        line = f"{stage:>9} {route or '-':>24} {elapsed:>8.1f}  {question[:70]}"
+        if use_llm:
+            start = time.perf_counter()
+            output = await llm_route([ChatMessage(content=question, role="user")])
+            llm_seconds.append(time.perf_counter() - start)
+            llm_correct += route_label(output) == expected
+            line += f"  [llm: {route_label(output)}, {llm_seconds[-1] * 1000:.0f} ms]"
+        print(line)
+
+    n = len(QUESTIONS)
+    print()
+    for stage, stats in stages.items():
+        accuracy = "" if stage == "llm" else f", {stats['correct']}/{stats['decided']} correct"
+        print(f"{stage}: decided {stats['decided']}/{n}{accuracy}, "
+              f"mean {stats['ms'] / stats['decided']:.1f} ms")
+    local = n - stages.get("llm", {}).get("decided", 0)
+    print(f"first stage decided {local}/{n} ({local / n:.0%}) without an LLM call")
+    if use_llm:
+        mean_llm = sum(llm_seconds) / len(llm_seconds) * 1000
+        local_ms = sum(stats["ms"] for stage, stats in stages.items() if stage != "llm")
+        print(f"LLM router: {llm_correct}/{n} correct, mean {mean_llm:.0f} ms; "
+              f"routing time saved ~{local * mean_llm - local_ms:.0f} ms over {n} questions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--llm", action="store_true", help="also route every question with the LLM router")
+    args = parser.parse_args()
+    asyncio.run(main(args.llm))
@@ -0,0 +1,99 @@
+"""
+Measure what schema pruning saves on the SQL-generation prompt.
+
+For a fixed set of product questions, renders PRODUCT_QUERY_PROMPT with every
+column and with the columns chosen by the ColumnSelector, and reports prompt
+tokens and how many of the columns each question needs were kept. With
+--llm, SQL is also generated both ways and executed; a question succeeds when
+its query runs and returns at least one row.
+
+Needs OPENAI_API_KEY (column and question embeddings, and --llm).
+
+    python -m application.backend.benchmarks.schema_pruning [--llm] [--top-n 25]
+"""
+import argparse
+import json
+
+import tiktoken
+
+from application.backend.chatbot.product_query import (
+    QUERY_ERROR, TABLE_NAME, generate_sql_query, product_store, query_database, sql_guard,
+)
+from application.backend.chatbot.prompts import PRODUCT_QUERY_PROMPT
+
+# (question, columns a correct query needs)
+QUESTIONS = [
+    ("Recommend a Cortex-M23 chip with TrustZone", ["Core", "TrustZone"]),
+    ("Which products support CAN FD and run above 100 MHz?", ["CAN_FD", "Operating_Frequency"]),
+    ("Low power chips with at least 64 KB of flash", ["Application", "Application_ROM__APROM__Flash"]),
+    ("I need an MCU with USB high-speed OTG in an LQFP64 package", ["USB_HS_OTG", "Package_Type"]),
+    ("Find parts with more than 40 GPIO and an Ethernet MAC", ["GPIO", "Ethernet_MAC__EMAC_"]),
+    ("Which chips work up to 105 degrees and have a 12-bit ADC?", ["Operating_Temperature__max_", "ADC___12_bit_"]),
+    ("Automotive qualified microcontrollers with CAN", ["AEC_Q100", "CAN"]),
+    ("Products with a TFT LCD interface and at least 256 KB SRAM", ["TFT_LCD_Interface", "SRAM"]),
+    ("Chips that can run from 1.8 V", ["Operating_Voltage___min_"]),
+    ("Give me motor control parts with QEI and PWM", ["Application", "Quadrature_Encoder_Interface__QEI_"]),
+    ("Which 8051 chips have a touch key controller?", ["Core", "Touch_Key"]),
+    ("Secure MCUs with AES, SHA and a true random number generator",
+     ["Advanced_Encryption_Standard__AES_", "Secure_Hash_Algorithm__SHA_", "True_Random_Number_Generator__TRNG_"]),
+    ("Bluetooth LE capable products", ["Bluetooth_Low_Energy_5.0__BLE_"]),
+    ("Parts with a camera interface and a 2D graphics engine", ["Camera_Interface", "2D_Graphics_Engine"]),
+    ("Which M031 series chips come in a QFN package?", ["Product_Series", "Package_Type"]),
+]
+
+
+def prompt_tokens(encoding, question, columns):
+    messages = PRODUCT_QUERY_PROMPT.format_messages(question=question, columns=", ".join(columns),
+                                                    table_name=TABLE_NAME)
+    return sum(len(encoding.encode(message.content)) for message in messages)
+
+
+def succeeded(conn, sql):
+    result = query_database(conn, sql, guard=sql_guard)
+    return result != QUERY_ERROR and json.loads(result)["row_count"] > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--llm", action="store_true", help="also generate and execute SQL both ways")
+    parser.add_argument("--top-n", type=int, default=None, help="override SCHEMA_TOP_COLUMNS")
+    args = parser.parse_args()
+
+    encoding = tiktoken.get_encoding("cl100k_base")
+    conn = product_store.connection()
+    selector = product_store.column_selector
+    if args.top_n is not None:
+        selector.top_n = args.top_n
+    all_columns = product_store.columns
+
+    full_tokens = pruned_tokens = kept = needed = 0
+    full_ok = pruned_ok = 0
+    print(f"{'full':>6} {'pruned':>7} {'cols':>5} {'recall':>7}  question")
+    for question, expected in QUESTIONS:
+        columns = selector.select(question)
+        full = prompt_tokens(encoding, question, all_columns)
+        pruned = prompt_tokens(encoding, question, columns)
+        hits = len(set(expected) & set(columns))
+        full_tokens += full
+        pruned_tokens += pruned
+        kept += hits
+        needed += len(expected)
+        line = f"{full:>6} {pruned:>7} {len(columns):>5} {hits / len(expected):>7.0%}  {question}"
+        if args.llm:
+            full_result = succeeded(conn, generate_sql_query(question, all_columns, TABLE_NAME))
+            pruned_result = succeeded(conn, generate_sql_query(question, columns, TABLE_NAME))
+            full_ok += full_result
+            pruned_ok += pruned_result
+            line += f"  [full {'ok' if full_result else 'FAIL'}, pruned {'ok' if pruned_result else 'FAIL'}]"
+        print(line)
+
+    n = len(QUESTIONS)
+    print(f"\nmean prompt tokens: full {full_tokens / n:.0f}, pruned {pruned_tokens / n:.0f} "
+          f"({1 - pruned_tokens / full_tokens:.0%} saved)")
+    print(f"needed columns kept: {kept}/{needed} ({kept / needed:.0%})")
+    if args.llm:
+        print(f"SQL success: full {full_ok}/{n}, pruned {pruned_ok}/{n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare per-turn request size and latency of session and stateless requests.
+
+Plays the same multi-turn conversation against the FastAPI app in-process
+twice: once sending the whole "conversation" list every turn (stateless),
+once sending only the new message with a session_id (state restored from the
+session checkpoint). Reports request bytes and server time per turn.
+
+The full graph runs, so OPENAI_API_KEY and the Cosmos settings are needed.
+
+    python -m application.backend.benchmarks.session_turns [--turns 6]
+"""
+import argparse
+import asyncio
+import json
+import uuid
+
+import httpx
+
+from application.backend.api.api import app
+
+QUESTIONS = [
+    "Recommend 5 Cortex-M23 chips for automotive applications",
+    "Which of those has the most flash?",
+    "What are the core, operating frequency and application of M032LG8AE?",
+    "How do I add these products to my PrestaShop store?",
+    "Do any of them support CAN FD?",
+    "How do I set up shipping for the EU?",
+]
+
+
+async def send(client, payload):
+    """Post one turn; returns (request bytes, server total ms, answer)."""
+    body = json.dumps(payload)
+    total_ms = None
+    answer = ""
+    async with client.stream("POST", "/chat_stream", content=body,
+                             headers={"Content-Type": "application/json"}) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("type") == "final":
+                answer = event["data"]
+                total_ms = event.get("metrics", {}).get("total_ms")
+    return len(body.encode()), total_ms, answer
+
+
+async def main(turns):
+    # httpx's ASGI transport does not run the app lifespan, which opens the session store
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            conversation = []
+            session_id = str(uuid.uuid4())
+            print(f"{'turn':>5} {'stateless bytes':>16} {'ms':>8} {'session bytes':>14} {'ms':>8}")
+            for number in range(turns):
+                question = QUESTIONS[number % len(QUESTIONS)]
+                conversation.append({"sender": "user", "content": question})
+                full_bytes, full_ms, answer = await send(client, {"conversation": conversation})
+                conversation.append({"sender": "assistant", "content": answer})
+                session_bytes, session_ms, _ = await send(client, {"session_id": session_id, "message": question})
+                print(f"{number + 1:>5} {full_bytes:>16} {full_ms or 0:>8.0f} {session_bytes:>14} "
+                      f"{session_ms or 0:>8.0f}")
+        print(f"session store: {app.state.sessions.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns))
@@ -1,53 +1,61 @@
+import asyncio
 import os
-from typing import List
+import threading
+import time
+from typing import Annotated, List
 
 from dotenv import load_dotenv
 from langchain_core.messages import (
     HumanMessage,
     AIMessage,
-    AnyMessage, ChatMessage,
+    AnyMessage, ChatMessage, RemoveMessage,
 )
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import create_react_agent
-from langgraph.types import Command
+from langgraph.types import Command, Send
 from typing_extensions import TypedDict, Literal
 
-from application.backend.chatbot.ecommmerce_query import ecommerce_query
-from application.backend.chatbot.product_query import process_user_query
-from application.backend.chatbot.prompts import product_query_prompt, ecommerce_prompt, supervisor_prompt, final_prompt
+from application.backend.chatbot.clients import get_chat_model
+from application.backend.chatbot.conversation import (
+    SummaryCache, conversation_window, latest_user_turn, message_line, messages_to_compact,
+)
+from application.backend.chatbot.ecommmerce_query import aecommerce_query
+from application.backend.chatbot.intent_router import ANSWERED_EXPLANATION, FINISH, ROUTE_EXPLANATIONS, IntentRouter
+from application.backend.chatbot.product_query import aprocess_user_query, embed_texts, product_store
+from application.backend.chatbot.prompts import (
+    product_query_prompt, ecommerce_prompt, supervisor_prompt, final_prompt, summary_prompt,
+)
 
 load_dotenv()
+# Tags the final-answer model call, so its tokens can be picked out of the graph's message stream
+FINAL_ANSWER_TAG = "final_answer"
 openai_api_key = os.getenv("OPENAI_API_KEY")
 deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
-
-model_mini = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    temperature=0,
-    openai_api_key=openai_api_key,
-    streaming=False
-)
-
-model = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.5,
-    openai_api_key=openai_api_key,
-    streaming=False
-)
-
-model_o1 = ChatOpenAI(
-    model="o1-mini",
-    openai_api_key=openai_api_key,
-    streaming=False
-)
-
-reason_llm = ChatOpenAI(
-    base_url="https://api.deepseek.com",
-    openai_api_key=deepseek_api_key,
-    model='deepseek-reasoner',
-    max_tokens=1000,
-)
+# Sub-agent tasks one routing decision may run in parallel
+SUPERVISOR_MAX_TASKS = int(os.getenv("SUPERVISOR_MAX_TASKS", "4"))
+# Let the first-stage router decide obvious turns without the LLM router
+ROUTER_FIRST_STAGE = os.getenv("ROUTER_FIRST_STAGE", "1") == "1"
+# Finish without the LLM router once every task of a first-stage-routed turn has an answer
+ROUTER_FINISH_WHEN_ANSWERED = os.getenv("ROUTER_FINISH_WHEN_ANSWERED", "1") == "1"
+# How the final answer is produced on FINISH:
+#   passthrough - the sub-agent's answer as is (several answers are merged)
+#   merge       - the sub-agents' answers under one heading each, no model call
+#   synthesize  - rewrite the conversation into one answer with FINISH_MODEL, streamed
+# Turns without any sub-agent answer are always synthesized.
+FINISH_STRATEGY = os.getenv("FINISH_STRATEGY", "synthesize")
+FINISH_MODEL = os.getenv("FINISH_MODEL", "o1-mini")
+# Routing stages that hand the whole question to a single agent
+LOCAL_ROUTING_STAGES = ("rules", "centroid")
+AGENT_TITLES = {"product_selection_agent": "Product selection", "ecommerce_agent": "E-commerce"}
+
+model_mini = get_chat_model("gpt-3.5-turbo", temperature=0)
+model = get_chat_model("gpt-4o", temperature=0.5)
+finish_model = get_chat_model(FINISH_MODEL, stream_usage=True)
+reason_llm = get_chat_model("deepseek-reasoner", base_url="https://api.deepseek.com", api_key=deepseek_api_key,
+                            max_tokens=1000)
 
 
 class MessagesState(TypedDict):
@@ -55,8 +63,10 @@ class MessagesState(TypedDict):
     Stores the entire conversation plus any data you want.
     'conversation' must always be a valid instance of Conversation,
     not just a list.
+    Nodes return only the messages they add; parallel sub-agents append
+    theirs in the same step, and compaction removes earlier turns by id.
     """
-    messages: List[AnyMessage]
+    messages: Annotated[List[AnyMessage], add_messages]
 
 
 class SupervisorState(MessagesState):
@@ -66,6 +76,13 @@ class SupervisorState(MessagesState):
     """
     next: str
     instructions: str
+    # Rolling summary of the turns compacted out of 'messages'
+    summary: str
+
+
+class AgentTaskState(TypedDict):
+    """Input of one sub-agent branch, sent by the supervisor."""
+    instruction: HumanMessage
 
 
 def get_latest_human_question(state: MessagesState) -> str:
@@ -77,56 +94,83 @@ def get_latest_human_question(state: MessagesState) -> str:
 
 
 @tool
-def ecommerce_chat_tool(state: MessagesState) -> str:
+async def ecommerce_chat_tool(state: MessagesState) -> str:
     """
     E-commerce Chat Tool Interface
     This function serves as an intermediary for handling e-commerce-related tasks within our multi-agent system.
     """
     question = get_latest_human_question(state)
-    ans = ecommerce_query(question)
+    ans = await aecommerce_query(question)
     print(f"Chatbot response: {ans}")
     return ans
 
 
 @tool
-def product_query_tool(state: MessagesState) -> str:
+async def product_query_tool(state: MessagesState) -> str:
     """
     Chip Product Selection Query Handler
 
     This function acts as the primary interface for processing queries related to chip product selection within the product-selection agent.
     """
     question = get_latest_human_question(state)
-    return process_user_query(question)
+    return await aprocess_user_query(question)
+
 
+intent_router = IntentRouter(
+    find_parts=lambda question: product_store.current_part_lookup().find_parts(question),
+    embed=embed_texts if openai_api_key else None,
+)
+# Summaries of compacted prefixes; stateless requests resend them every turn
+summary_cache = SummaryCache()
 
 product_selection_agent = create_react_agent(
     model,
     tools=[product_query_tool],
     state_modifier=(product_query_prompt),
+    # Sub-agent transcripts are per task; they are not checkpointed with the session
+    checkpointer=False,
 )
 
 ecommerce_agent = create_react_agent(
     model,
     tools=[ecommerce_chat_tool],
     state_modifier=(ecommerce_prompt),
+    checkpointer=False,
 )
 
 
-class RouterOutput(TypedDict):
-    next: Literal["product_selection_agent", "ecommerce_agent", "FINISH"]
+class AgentTask(TypedDict):
+    agent: Literal["product_selection_agent", "ecommerce_agent"]
     instructions: str
+
+
+class RouterOutput(TypedDict):
+    next: Literal["AGENTS", "FINISH"]
+    tasks: List[AgentTask]
     title: str
     reason: str
 
 
-def produce_final_answer(all_messages: list[AnyMessage], llm: ChatOpenAI) -> str:
-    conversation_text = ""
+finish_lock = threading.Lock()
+# strategy -> {"count", "total_ms", "input_tokens", "output_tokens"}
+finish_stats = {}
+
+
+def turn_answers(messages):
+    """Sub-agent answers given since the user's latest message."""
+    start = latest_user_turn(messages)
+    return [msg for msg in messages[start + 1:]
+            if isinstance(msg, AIMessage) and msg.content and not msg.tool_calls and msg.name != "supervisor"]
+
+
+def merge_answers(answers):
+    if len(answers) == 1:
+        return answers[0].content
+    return "\n\n".join(f"### {AGENT_TITLES.get(msg.name, 'Answer')}\n\n{msg.content}" for msg in answers)
 
-    for msg in all_messages:
-        if isinstance(msg, ChatMessage):
-            conversation_text += f"[USER]: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            conversation_text += f"[ASSISTANT]: {msg.content}\n"
+
+async def synthesize_answer(all_messages: list[AnyMessage], llm: ChatOpenAI, summary=""):
+    conversation_text = conversation_window(all_messages, summary)
 
     final_prompt_text = (
         "SYSTEM PROMPT:\n"
@@ -136,95 +180,255 @@ def produce_final_answer(all_messages: list[AnyMessage], llm: ChatOpenAI) -> str
         "END.\n"
     )
 
-    result = llm.invoke(final_prompt_text)
-    return result.content
+    result = await llm.with_config(tags=[FINAL_ANSWER_TAG]).ainvoke(final_prompt_text)
+    return result.content, result.usage_metadata or {}
 
 
-def supervisor_node(state: SupervisorState) -> Command[
-    Literal["product_selection_agent", "ecommerce_agent", "__end__"]
-]:
-    conversation_text = ""
-
-    for msg in state["messages"]:
-        if isinstance(msg, ChatMessage):
-            conversation_text += f"[USER]: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            conversation_text += f"[ASSISTANT]: {msg.content}\n"
-
-    final_prompt_text = (
+async def produce_final_answer(all_messages: list[AnyMessage], llm: ChatOpenAI, strategy=None, summary=""):
+    """
+    Produce the answer of a finished turn.
+
+    Args:
+        all_messages (list): Conversation state.
+        llm (ChatOpenAI): Model used when the answer is synthesized.
+        strategy (str): "passthrough", "merge" or "synthesize"; defaults to
+            FINISH_STRATEGY.
+        summary (str): Rolling summary of compacted turns.
+
+    Returns:
+        tuple: (answer, metrics) where metrics holds the strategy actually
+        used, its latency in ms and the tokens it cost.
+    """
+    strategy = strategy or FINISH_STRATEGY
+    start = time.perf_counter()
+    answers = turn_answers(all_messages)
+    usage = {}
+    if strategy == "passthrough" and len(answers) == 1:
+        answer = answers[0].content
+    elif strategy in ("passthrough", "merge") and answers:
+        strategy = "merge"
+        answer = merge_answers(answers)
+    else:
+        strategy = "synthesize"
+        answer, usage = await synthesize_answer(all_messages, llm, summary)
+
+    metrics = {
+        "strategy": strategy,
+        "ms": (time.perf_counter() - start) * 1000,
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+    }
+    with finish_lock:
+        stats = finish_stats.setdefault(strategy, {"count": 0, "total_ms": 0.0, "input_tokens": 0,
+                                                   "output_tokens": 0})
+        stats["count"] += 1
+        stats["total_ms"] += metrics["ms"]
+        stats["input_tokens"] += metrics["input_tokens"]
+        stats["output_tokens"] += metrics["output_tokens"]
+    print(f"Final answer by {strategy}: {metrics['ms']:.0f} ms, "
+          f"{metrics['input_tokens']} + {metrics['output_tokens']} tokens")
+    return answer, metrics
+
+
+def finish_summary():
+    """Per-strategy count, mean latency and mean token cost of final answers."""
+    with finish_lock:
+        return {
+            strategy: {
+                "count": stats["count"],
+                "mean_ms": stats["total_ms"] / stats["count"],
+                "mean_input_tokens": stats["input_tokens"] / stats["count"],
+                "mean_output_tokens": stats["output_tokens"] / stats["count"],
+            }
+            for strategy, stats in finish_stats.items()
+        }
+
+
+def routing_prompt(messages, summary=""):
+    return (
         "SYSTEM PROMPT:\n"
         f"{supervisor_prompt}\n\n"
         "CONVERSATION:\n"
-        f"{conversation_text}\n\n"
+        f"{conversation_window(messages, summary)}\n\n"
         "END OF CONVERSATION.\n"
     )
 
-    llm_output = model.with_structured_output(RouterOutput).invoke(final_prompt_text)
 
-    next_agent = llm_output["next"]
-    instructions = llm_output["instructions"]
+async def llm_route(messages, summary=""):
+    final_prompt_text = routing_prompt(messages, summary)
+
+    start = time.perf_counter()
+    llm_output = await model.with_structured_output(RouterOutput).ainvoke(final_prompt_text)
+    intent_router.record("llm", llm_output["next"], time.perf_counter() - start)
+    return llm_output
+
+
+def turn_answered(turn_messages):
+    """Whether every instruction issued this turn has a sub-agent answer."""
+    instructions = sum(1 for msg in turn_messages
+                       if isinstance(msg, HumanMessage) and msg.name == "supervisor_instructions")
+    answers = sum(1 for msg in turn_messages
+                  if isinstance(msg, AIMessage) and msg.content and not msg.tool_calls and msg.name != "supervisor")
+    return instructions > 0 and answers >= instructions
+
+
+def routed_locally(turn_messages):
+    """
+    Whether the turn's instructions were issued by the first stage.
+
+    The first stage hands the whole question to one agent, so an answer covers
+    it. The LLM router may split a question and route only part of it; its
+    turns go back to the LLM router, which checks the answers are sufficient.
+    """
+    return all(getattr(msg, "routed_by", None) in LOCAL_ROUTING_STAGES for msg in turn_messages
+               if isinstance(msg, HumanMessage) and msg.name == "supervisor_instructions")
+
+
+async def first_stage_route(messages, summary=""):
+    """
+    Routing decision made without the LLM router.
+
+    Returns:
+        RouterOutput: The decision, or None when the LLM router has to decide.
+    """
+    start = latest_user_turn(messages)
+    if start < 0:
+        return None
+    if start < len(messages) - 1:
+        turn = messages[start + 1:]
+        if not (ROUTER_FINISH_WHEN_ANSWERED and routed_locally(turn) and turn_answered(turn)):
+            return None
+        intent_router.record("answered", FINISH, 0.0)
+        route, stage = FINISH, "answered"
+    else:
+        question = messages[start].content
+        follow_up = bool(summary) or any(isinstance(msg, AIMessage) for msg in messages[:start])
+        decision = await asyncio.to_thread(intent_router.route, question, follow_up)
+        if decision is None:
+            return None
+        route, stage = decision
+    print(f"Routing decided by the {stage} stage: {route}")
+
+    title, reason = ANSWERED_EXPLANATION if stage == "answered" else ROUTE_EXPLANATIONS[route]
+    tasks = [] if route == FINISH else [{"agent": route, "instructions": messages[start].content}]
+    return {"next": FINISH if route == FINISH else "AGENTS", "tasks": tasks, "title": title, "reason": reason,
+            "stage": stage}
+
+
+async def supervisor_node(state: SupervisorState) -> Command[
+    Literal["product_selection_agent", "ecommerce_agent", "__end__"]
+]:
+    summary = state.get("summary", "")
+    llm_output = await first_stage_route(state["messages"], summary) if ROUTER_FIRST_STAGE else None
+    if llm_output is None:
+        llm_output = await llm_route(state["messages"], summary)
+
+    tasks = llm_output.get("tasks") or []
     title = llm_output["title"]
     reason = llm_output["reason"]
+    stage = llm_output.get("stage", "llm")
 
-    if next_agent == "FINISH":
-        final_answer = produce_final_answer(state["messages"], model_o1)
-        finish_msg = AIMessage(content=final_answer, title=title, reason=reason, name="supervisor")
+    if llm_output["next"] == "FINISH" or not tasks:
+        final_answer, finish_metrics = await produce_final_answer(state["messages"], finish_model, summary=summary)
+        finish_msg = AIMessage(content=final_answer, title=title, reason=reason, name="supervisor",
+                               finish=finish_metrics)
         return Command(
             goto=END,
-            update={"messages": state["messages"] + [finish_msg]}
+            update={"messages": [finish_msg]}
         )
 
-    new_user_msg = HumanMessage(content=instructions, title=title, reason=reason, name="supervisor_instructions",
-                                role="user")
-    updated_msgs = state["messages"] + [new_user_msg]
+    # Independent tasks fan out as parallel branches; all of them finish before the next routing decision
+    instruction_msgs = []
+    sends = []
+    for task in tasks[:SUPERVISOR_MAX_TASKS]:
+        new_user_msg = HumanMessage(content=task["instructions"], title=title, reason=reason,
+                                    name="supervisor_instructions", role="user", routed_by=stage)
+        instruction_msgs.append(new_user_msg)
+        sends.append(Send(task["agent"], {"instruction": new_user_msg}))
 
     return Command(
-        goto=next_agent,
-        update={"messages": updated_msgs, "next": next_agent, "instructions": instructions}
+        goto=sends,
+        update={
+            "messages": instruction_msgs,
+            "next": ",".join(send.node for send in sends),
+            "instructions": "\n".join(msg.content for msg in instruction_msgs),
+        }
     )
 
 
-def product_selection_node(state: SupervisorState) -> Command[Literal["supervisor"]]:
-    last_instruction = state["messages"][-1]
+async def run_sub_agent(agent, name, task: AgentTaskState) -> dict:
+    """
+    Run a ReAct sub-agent on one instruction and return its answer, named
+    after the agent.
 
-    sub_state = {
-        "messages": [last_instruction],
-    }
+    The tool calls and tool outputs (JSON product dumps, retrieved documents)
+    stay in the sub-agent's own transcript; only the answer joins the main
+    conversation.
+    """
+    result = await agent.ainvoke({"messages": [task["instruction"]]})
+    answer = result["messages"][-1]
+    if not isinstance(answer, AIMessage) or answer.tool_calls:
+        return {"messages": []}
+    return {"messages": [answer.model_copy(update={"name": name})]}
 
-    result = product_selection_agent.invoke(sub_state)
 
-    updated_main = {
-        "messages": state["messages"] + result["messages"],  # unify results back
-    }
-    return Command(
-        update=updated_main,
-        goto="supervisor",
+async def summarize_turns(summary, messages):
+    """Fold `messages` into the rolling summary with the small model."""
+    new_text = "".join(message_line(msg) for msg in messages)
+    prompt = (
+        "SYSTEM PROMPT:\n"
+        f"{summary_prompt}\n\n"
+        "EXISTING SUMMARY:\n"
+        f"{summary or '(none)'}\n\n"
+        "NEW MESSAGES:\n"
+        f"{new_text}\n"
+        "END.\n"
     )
+    result = await model_mini.ainvoke(prompt)
+    return result.content
 
 
-def ecommerce_node(state: SupervisorState) -> Command[Literal["supervisor"]]:
-    last_instruction = state["messages"][-1]
+async def compact_history_node(state: SupervisorState) -> dict:
+    """
+    Keep the conversation state bounded at the start of a turn.
 
-    sub_state = {
-        "messages": [last_instruction],
-    }
+    Once the turns before the current one outgrow SUMMARY_TRIGGER_TOKENS, the
+    oldest of them are folded into the rolling summary and removed from the
+    state; the newest SUMMARY_KEEP_TOKENS stay verbatim. Stateless requests
+    resend the turns compacted by the previous request, so only the part of
+    the prefix not found in summary_cache is summarised.
+    """
+    compacted = messages_to_compact(state["messages"])
+    if not compacted:
+        return {}
+    start = time.perf_counter()
+    previous = state.get("summary", "")
+    covered, summary = summary_cache.lookup(previous, compacted)
+    if covered < len(compacted):
+        summary = await summarize_turns(summary, compacted[covered:])
+        summary_cache.store(previous, compacted, summary)
+    print(f"Compacted {len(compacted)} earlier messages into the summary ({covered} already summarised) in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+    return {"summary": summary, "messages": [RemoveMessage(id=msg.id) for msg in compacted]}
 
-    result = ecommerce_agent.invoke(sub_state)
 
-    updated_main = {
-        "messages": state["messages"] + result["messages"],
-    }
-    return Command(
-        update=updated_main,
-        goto="supervisor",
-    )
+async def product_selection_node(task: AgentTaskState) -> dict:
+    return await run_sub_agent(product_selection_agent, "product_selection_agent", task)
+
+
+async def ecommerce_node(task: AgentTaskState) -> dict:
+    return await run_sub_agent(ecommerce_agent, "ecommerce_agent", task)
 
 
 builder = StateGraph(SupervisorState)
-builder.add_edge(START, "supervisor")  # always start at supervisor
+builder.add_edge(START, "compact_history")  # every turn starts at the supervisor, after compaction
+builder.add_node("compact_history", compact_history_node)
+builder.add_edge("compact_history", "supervisor")
 builder.add_node("supervisor", supervisor_node)
 builder.add_node("product_selection_agent", product_selection_node)
 builder.add_node("ecommerce_agent", ecommerce_node)
+builder.add_edge("product_selection_agent", "supervisor")
+builder.add_edge("ecommerce_agent", "supervisor")
 graph = builder.compile()
 
 
@@ -238,7 +442,7 @@ def pretty_print_messages(update):
 
     for node_name, node_update in update.items():
         print(f"Update from node: {node_name}\n")
-        for m in node_update["messages"]:
+        for m in (node_update or {}).get("messages", []):
             role = "assistant"
             if isinstance(m, ChatMessage):
                 role = "user"
@@ -247,6 +451,11 @@ def pretty_print_messages(update):
         print()
 
 
+async def main(initial_state):
+    async for chunk in graph.astream(initial_state):
+        pretty_print_messages(chunk)
+
+
 if __name__ == "__main__":
     # user_messages = [
     #     ("user", "I'm looking for 5 products for automotive applications with a Cortex-M23 chip, "
@@ -273,5 +482,4 @@ if __name__ == "__main__":
     for _, content in user_messages:
         initial_state["messages"].append(ChatMessage(content=content, role="user"))
 
-    for chunk in graph.stream(initial_state):
-        pretty_print_messages(chunk)
+    asyncio.run(main(initial_state))
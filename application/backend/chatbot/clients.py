@@ -0,0 +1,339 @@
+import asyncio
+import json
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
+
+load_dotenv()
+openai_api_key = os.getenv("OPENAI_API_KEY")
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Slower (reasoning) models get their own read timeout, e.g. '{"o1-mini": 120}'
+LLM_MODEL_TIMEOUTS = {"o1-mini": 120.0, "deepseek-reasoner": 180.0, **json.loads(os.getenv("LLM_MODEL_TIMEOUTS", "{}"))}
+
+# Shared keep-alive pool, used for every host (OpenAI, DeepSeek)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+
+# Requests in flight per model; others wait. '{"gpt-4o": 8}' overrides single models
+LLM_DEFAULT_CONCURRENCY = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "16"))
+LLM_CONCURRENCY = {"o1-mini": 8, "deepseek-reasoner": 4, **json.loads(os.getenv("LLM_CONCURRENCY", "{}"))}
+
+
+def request_model(request):
+    """Model named in an API request body, or None (e.g. for GET requests)."""
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return None
+
+
+class ModelLimiter:
+    """
+    Per-model concurrency limits with in-flight/waiting counters.
+
+    Sync callers share one threading.Semaphore per model; async callers get
+    an asyncio.Semaphore per model and event loop. A limit covers both the
+    request and the reading of its (possibly streamed) response body.
+    """
+
+    def __init__(self, limits=None, default_limit=LLM_DEFAULT_CONCURRENCY):
+        self.limits = LLM_CONCURRENCY if limits is None else limits
+        self.default_limit = default_limit
+        self.lock = threading.Lock()
+        self.sync_semaphores = {}
+        # event loop -> {model: asyncio.Semaphore}
+        self.async_semaphores = weakref.WeakKeyDictionary()
+        self.stats = {}
+
+    def limit(self, model):
+        return self.limits.get(model, self.default_limit)
+
+    def _model_stats(self, model):
+        return self.stats.setdefault(model, {"in_flight": 0, "waiting": 0, "peak_in_flight": 0, "requests": 0})
+
+    def _update(self, model, waiting=0, in_flight=0):
+        with self.lock:
+            stats = self._model_stats(model)
+            stats["waiting"] += waiting
+            stats["in_flight"] += in_flight
+            if in_flight > 0:
+                stats["requests"] += 1
+                stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+    def acquire(self, model):
+        """Block until a slot for `model` is free; returns the release callback."""
+        with self.lock:
+            semaphore = self.sync_semaphores.setdefault(model, threading.BoundedSemaphore(self.limit(model)))
+        self._update(model, waiting=1)
+        semaphore.acquire()
+        self._update(model, waiting=-1, in_flight=1)
+        return self._releaser(model, semaphore.release)
+
+    async def aacquire(self, model):
+        """Async acquire(); returns the release callback."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            semaphores = self.async_semaphores.setdefault(loop, {})
+            semaphore = semaphores.setdefault(model, asyncio.BoundedSemaphore(self.limit(model)))
+        self._update(model, waiting=1)
+        try:
+            await semaphore.acquire()
+        finally:
+            self._update(model, waiting=-1)
+        self._update(model, in_flight=1)
+        return self._releaser(model, semaphore.release)
+
+    def _releaser(self, model, release):
+        released = False
+
+        def release_once():
+            nonlocal released
+            if not released:
+                released = True
+                self._update(model, in_flight=-1)
+                release()
+        return release_once
+
+    def snapshot(self):
+        with self.lock:
+            return {model: {**stats, "limit": self.limit(model)} for model, stats in self.stats.items()}
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+
+class LimitingTransport(httpx.BaseTransport):
+    """Sync transport that holds a per-model slot until the response is closed."""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request):
+        model = request_model(request)
+        if model is None:
+            return self.transport.handle_request(request)
+        release = self.limiter.acquire(model)
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_ReleasingStream(response.stream, release),
+                              extensions=response.extensions, request=request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncLimitingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of LimitingTransport."""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request):
+        model = request_model(request)
+        if model is None:
+            return await self.transport.handle_async_request(request)
+        release = await self.limiter.aacquire(model)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncReleasingStream(response.stream, release),
+                              extensions=response.extensions, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ClientRegistry:
+    """
+    Process-wide LLM and HTTP clients.
+
+    One sync and one async httpx client, each with a keep-alive connection
+    pool and per-model concurrency limits, back every OpenAI-compatible
+    client handed out here. Chat models are cached by their settings, so
+    nodes and tools asking for the same model share one instance.
+    """
+
+    def __init__(self, limiter=None, http_transport=None, async_http_transport=None):
+        """
+        Args:
+            limiter (ModelLimiter): Per-model concurrency limits.
+            http_transport (httpx.BaseTransport): Transport of the sync client;
+                defaults to a pooled httpx.HTTPTransport with limits().
+            async_http_transport (httpx.AsyncBaseTransport): Transport of the
+                async client; defaults to a pooled httpx.AsyncHTTPTransport.
+        """
+        self.limiter = limiter or ModelLimiter()
+        self.lock = threading.Lock()
+        self.http_transport = http_transport
+        self.async_http_transport = async_http_transport
+        self._http_client = None
+        self._async_http_client = None
+        self.chat_models = {}
+        self._openai = None
+        self._async_openai = None
+
+    @staticmethod
+    def timeout(model=None):
+        read = LLM_MODEL_TIMEOUTS.get(model, LLM_TIMEOUT_SECONDS)
+        return httpx.Timeout(read, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def limits():
+        return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+    def http_client(self):
+        with self.lock:
+            if self._http_client is None:
+                if self.http_transport is None:
+                    self.http_transport = httpx.HTTPTransport(limits=self.limits())
+                self._http_client = httpx.Client(transport=LimitingTransport(self.http_transport, self.limiter),
+                                                 timeout=self.timeout())
+            return self._http_client
+
+    def async_http_client(self):
+        with self.lock:
+            if self._async_http_client is None:
+                if self.async_http_transport is None:
+                    self.async_http_transport = httpx.AsyncHTTPTransport(limits=self.limits())
+                self._async_http_client = httpx.AsyncClient(
+                    transport=AsyncLimitingTransport(self.async_http_transport, self.limiter), timeout=self.timeout()
+                )
+            return self._async_http_client
+
+    def chat_model(self, model, temperature=None, base_url=None, api_key=None, **kwargs):
+        """
+        Shared ChatOpenAI for these settings.
+
+        Args:
+            model (str): Model name.
+            temperature (float): Sampling temperature; None keeps the API default.
+            base_url (str): For OpenAI-compatible providers such as DeepSeek.
+            api_key (str): Defaults to OPENAI_API_KEY.
+            **kwargs: Other ChatOpenAI settings, e.g. max_tokens.
+        """
+        key = (model, temperature, base_url, api_key, tuple(sorted(kwargs.items())))
+        http_client = self.http_client()
+        async_http_client = self.async_http_client()
+        with self.lock:
+            if key not in self.chat_models:
+                options = dict(kwargs)
+                if temperature is not None:
+                    options["temperature"] = temperature
+                if base_url is not None:
+                    options["base_url"] = base_url
+                self.chat_models[key] = ChatOpenAI(
+                    model=model,
+                    openai_api_key=api_key or openai_api_key,
+                    streaming=False,
+                    request_timeout=self.timeout(model),
+                    max_retries=LLM_MAX_RETRIES,
+                    http_client=http_client,
+                    http_async_client=async_http_client,
+                    **options,
+                )
+            return self.chat_models[key]
+
+    def openai(self):
+        """Shared sync OpenAI client (embeddings)."""
+        http_client = self.http_client()
+        with self.lock:
+            if self._openai is None:
+                self._openai = OpenAI(api_key=openai_api_key, http_client=http_client, timeout=self.timeout(),
+                                      max_retries=LLM_MAX_RETRIES)
+            return self._openai
+
+    def async_openai(self):
+        """Shared AsyncOpenAI client (embeddings on the async path)."""
+        async_http_client = self.async_http_client()
+        with self.lock:
+            if self._async_openai is None:
+                self._async_openai = AsyncOpenAI(api_key=openai_api_key, http_client=async_http_client,
+                                                 timeout=self.timeout(), max_retries=LLM_MAX_RETRIES)
+            return self._async_openai
+
+    @staticmethod
+    def _pool_stats(transport):
+        if transport is None:
+            return {"connections": 0, "idle": 0, "active": 0}
+        # httpx does not expose its pool; other transports (or httpx versions) are reported without counts
+        connections = getattr(getattr(transport, "_pool", None), "connections", None)
+        if connections is None:
+            return {"connections": None, "idle": None, "active": None}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"connections": len(connections), "idle": idle, "active": len(connections) - idle,
+                "max_connections": HTTP_MAX_CONNECTIONS, "max_keepalive": HTTP_MAX_KEEPALIVE}
+
+    def stats(self):
+        """Connection pool utilisation and per-model in-flight/waiting requests."""
+        return {
+            "sync_pool": self._pool_stats(self.http_transport),
+            "async_pool": self._pool_stats(self.async_http_transport),
+            "models": self.limiter.snapshot(),
+            "chat_models": len(self.chat_models),
+        }
+
+
+registry = ClientRegistry()
+
+
+def get_chat_model(model, temperature=None, base_url=None, api_key=None, **kwargs):
+    return registry.chat_model(model, temperature=temperature, base_url=base_url, api_key=api_key, **kwargs)
+
+
+def get_openai_client():
+    return registry.openai()
+
+
+def get_async_openai_client():
+    return registry.async_openai()
+
+
+def client_stats():
+    return registry.stats()
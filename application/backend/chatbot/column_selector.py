@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+COLUMN_EMBEDDINGS_TABLE = "column_embeddings"
+# Columns offered to the SQL generator per question; 0 disables pruning
+SCHEMA_TOP_COLUMNS = int(os.getenv("SCHEMA_TOP_COLUMNS", "25"))
+# Always offered, whatever the question
+MANDATORY_COLUMNS = ["Part_No"]
+# Distinct values quoted in a column description
+COLUMN_SAMPLE_VALUES = 5
+
+
+def describe_columns(conn, table_name, columns):
+    """
+    Short text per column for embedding: readable name, type and sample values.
+
+    `<column>_text` companions are skipped; they are offered with their base
+    column.
+
+    Returns:
+        dict: column name -> description.
+    """
+    types = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+    descriptions = {}
+    for name in columns:
+        if name.endswith("_text") and name[:-len("_text")] in types:
+            continue
+        samples = [row[0] for row in conn.execute(
+            f'SELECT DISTINCT "{name}" FROM "{table_name}" WHERE "{name}" IS NOT NULL LIMIT ?',
+            (COLUMN_SAMPLE_VALUES,),
+        )]
+        readable = " ".join(name.replace("_", " ").split())
+        description = f"{readable} ({types.get(name, 'TEXT')})"
+        if samples:
+            description += ", e.g. " + ", ".join(str(v) for v in samples)
+        descriptions[name] = description
+    return descriptions
+
+
+def store_column_embeddings(conn, table_name, columns, embed=None):
+    """
+    Write the column descriptions and, when `embed` is given, their embeddings.
+
+    Args:
+        conn (sqlite3.Connection): Writable connection in autocommit mode.
+        table_name (str): Product table.
+        columns (list): Column names in table order.
+        embed (callable): Maps a list of texts to a list of vectors. Without
+            it (or if it fails) embeddings are left NULL and computed on first
+            use instead.
+    """
+    descriptions = describe_columns(conn, table_name, columns)
+    embeddings = [None] * len(descriptions)
+    if embed is not None:
+        try:
+            embeddings = [np.asarray(v, dtype=np.float32).tobytes() for v in embed(list(descriptions.values()))]
+        except Exception as e:
+            print(f"Column embeddings not computed: {e}")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {COLUMN_EMBEDDINGS_TABLE}")
+        conn.execute(f"CREATE TABLE {COLUMN_EMBEDDINGS_TABLE} "
+                     "(column_name TEXT PRIMARY KEY, description TEXT NOT NULL, embedding BLOB)")
+        conn.executemany(
+            f"INSERT INTO {COLUMN_EMBEDDINGS_TABLE} (column_name, description, embedding) VALUES (?, ?, ?)",
+            [(name, description, embedding)
+             for (name, description), embedding in zip(descriptions.items(), embeddings)],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class ColumnSelector:
+    """
+    Picks the columns worth showing the SQL generator for a question.
+
+    Each column is represented by an embedding of its description. A question
+    gets the mandatory columns, the columns it names explicitly (via
+    `mentioned`), and the `top_n` most similar columns, in table order and
+    with their `_text` companions. Embeddings missing from the database are
+    computed once, on first use.
+    """
+
+    def __init__(self, columns, descriptions, embeddings=None, embed=None, top_n=SCHEMA_TOP_COLUMNS,
+                 mandatory=MANDATORY_COLUMNS, mentioned=None):
+        self.columns = list(columns)
+        self.descriptions = descriptions
+        self.names = list(descriptions)
+        self.embed = embed
+        self.top_n = top_n
+        self.mandatory = [name for name in mandatory if name in self.columns]
+        self.mentioned = mentioned
+        self.lock = threading.Lock()
+        self.matrix = None
+        if embeddings is not None and all(v is not None for v in embeddings):
+            self.matrix = self._normalize(np.stack([np.asarray(v, dtype=np.float32) for v in embeddings]))
+
+    @classmethod
+    def from_connection(cls, conn, table_name, columns, **kwargs):
+        """Load the descriptions and embeddings stored at build time, or describe the table now."""
+        try:
+            rows = conn.execute(
+                f"SELECT column_name, description, embedding FROM {COLUMN_EMBEDDINGS_TABLE}"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        rows = [row for row in rows if row[0] in columns]
+        if not rows:
+            return cls(columns, describe_columns(conn, table_name, columns), **kwargs)
+        embeddings = [None if blob is None else np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows]
+        return cls(columns, {name: description for name, description, _ in rows}, embeddings, **kwargs)
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _ensure_matrix(self):
+        with self.lock:
+            if self.matrix is None:
+                vectors = self.embed([self.descriptions[name] for name in self.names])
+                self.matrix = self._normalize(np.stack([np.asarray(v, dtype=np.float32) for v in vectors]))
+        return self.matrix
+
+    def select(self, question):
+        """
+        Columns to offer for `question`; all of them when pruning is off or fails.
+
+        Returns:
+            list: Column names in table order.
+        """
+        if self.top_n <= 0 or self.top_n >= len(self.names) or self.embed is None:
+            return self.columns
+        try:
+            matrix = self._ensure_matrix()
+            query = self._normalize(np.asarray(self.embed([question])[0], dtype=np.float32))
+        except Exception as e:
+            print(f"Schema pruning skipped: {e}")
+            return self.columns
+
+        scores = matrix @ query
+        best = np.argpartition(scores, -self.top_n)[-self.top_n:]
+        chosen = set(self.mandatory)
+        chosen.update(self.names[i] for i in best)
+        if self.mentioned is not None:
+            chosen.update(self.mentioned(question))
+        chosen.update(f"{name}_text" for name in list(chosen))
+        return [name for name in self.columns if name in chosen]
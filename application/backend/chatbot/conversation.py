@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, ChatMessage
+
+# Conversation tokens the supervisor's routing and final-answer prompts may carry
+SUPERVISOR_WINDOW_TOKENS = int(os.getenv("SUPERVISOR_WINDOW_TOKENS", "3000"))
+# Earlier turns are summarised once they exceed SUMMARY_TRIGGER_TOKENS; the newest
+# SUMMARY_KEEP_TOKENS of them stay verbatim
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "4000"))
+SUMMARY_KEEP_TOKENS = int(os.getenv("SUMMARY_KEEP_TOKENS", "1000"))
+# Rough token estimate; prompt budgets do not need an exact tokenizer
+CHARS_PER_TOKEN = 4
+# Rolling summaries remembered per compacted conversation prefix
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "256"))
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_user_message(msg):
+    return isinstance(msg, ChatMessage) and msg.role == "user"
+
+
+def message_line(msg):
+    """Prompt line of a user or assistant message; other messages are not shown."""
+    if isinstance(msg, ChatMessage):
+        return f"[USER]: {msg.content}\n"
+    if isinstance(msg, AIMessage) and msg.content:
+        return f"[ASSISTANT]: {msg.content}\n"
+    return ""
+
+
+def latest_user_turn(messages):
+    """Index of the user's latest message, or -1."""
+    for i in range(len(messages) - 1, -1, -1):
+        if is_user_message(messages[i]):
+            return i
+    return -1
+
+
+def conversation_window(messages, summary="", budget=SUPERVISOR_WINDOW_TOKENS):
+    """
+    Conversation text for a supervisor prompt.
+
+    The current turn is always included; earlier messages are added newest
+    first while they fit in `budget` tokens, after the summary of the turns
+    that were compacted away.
+
+    Args:
+        messages (list): Conversation state.
+        summary (str): Rolling summary of earlier turns.
+        budget (int): Token budget of the returned text.
+
+    Returns:
+        str: One "[USER]: ..." / "[ASSISTANT]: ..." line per message.
+    """
+    current = max(latest_user_turn(messages), 0)
+    used = estimate_tokens(summary) if summary else 0
+    lines = []
+    for i in range(len(messages) - 1, -1, -1):
+        line = message_line(messages[i])
+        if not line:
+            continue
+        cost = estimate_tokens(line)
+        if i < current and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    text = "".join(reversed(lines))
+    if summary:
+        text = f"[SUMMARY OF EARLIER CONVERSATION]: {summary}\n{text}"
+    return text
+
+
+def messages_to_compact(messages, trigger=SUMMARY_TRIGGER_TOKENS, keep=SUMMARY_KEEP_TOKENS):
+    """
+    Earlier-turn messages that should be folded into the rolling summary.
+
+    Returns:
+        list: The oldest messages, ending at a turn boundary, once the turns
+        before the current one exceed `trigger` tokens; otherwise empty.
+    """
+    current = latest_user_turn(messages)
+    if current <= 0:
+        return []
+    earlier = messages[:current]
+    if sum(estimate_tokens(message_line(msg)) for msg in earlier) <= trigger:
+        return []
+
+    keep_from = current
+    used = 0
+    for i in range(current - 1, -1, -1):
+        used += estimate_tokens(message_line(earlier[i]))
+        if used > keep:
+            break
+        keep_from = i
+    # Keep whole turns: the verbatim part starts at a user message
+    while keep_from < current and not is_user_message(messages[keep_from]):
+        keep_from += 1
+    return messages[:keep_from]
+
+
+class SummaryCache:
+    """
+    Rolling summaries keyed by the conversation prefix they cover.
+
+    A stateless request carries the whole conversation and no summary, so it
+    compacts a prefix that the previous request of the same conversation had
+    already summarised, plus the turns added since. Keys chain a hash over the
+    starting summary and the message lines of the prefix; lookup() finds the
+    longest cached prefix that ends at a turn boundary, so only the messages
+    after it need summarising.
+    """
+
+    def __init__(self, max_entries=SUMMARY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "partial_hits": 0, "misses": 0}
+
+    @staticmethod
+    def prefix_keys(summary, messages):
+        """(length, key) of `messages` and of each prefix ending before a user message, longest first."""
+        digest = hashlib.sha256(summary.encode("utf-8")).hexdigest()
+        keys = []
+        for i, msg in enumerate(messages):
+            if i and is_user_message(msg):
+                keys.append((i, digest))
+            digest = hashlib.sha256(f"{digest}{message_line(msg)}".encode("utf-8")).hexdigest()
+        keys.append((len(messages), digest))
+        return keys[::-1]
+
+    def lookup(self, summary, messages):
+        """
+        Longest cached summary of a prefix of `messages`.
+
+        Args:
+            summary (str): Summary the messages are folded into.
+            messages (list): Messages about to be compacted.
+
+        Returns:
+            tuple: (number of leading messages covered, summary covering
+            them); (0, summary) when nothing is cached.
+        """
+        with self.lock:
+            for length, key in self.prefix_keys(summary, messages):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.stats["hits" if length == len(messages) else "partial_hits"] += 1
+                    return length, self.entries[key]
+            self.stats["misses"] += 1
+        return 0, summary
+
+    def store(self, summary, messages, result):
+        """Remember `result` as the summary of `messages` folded into `summary`."""
+        key = self.prefix_keys(summary, messages)[0][1]
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -3,38 +3,26 @@ import os
 from dotenv import load_dotenv
 from langchain.schema import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
 
+from application.backend.chatbot.clients import get_async_openai_client, get_chat_model, get_openai_client
 from application.backend.chatbot.prompts import ANSWER_PROMPT
 from application.backend.datastore.db import ChatbotVectorDatabase
 
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-chatvec = ChatbotVectorDatabase()
+chatvec = ChatbotVectorDatabase(openai_client=get_openai_client(), async_openai_client=get_async_openai_client())
 
 
-def ecommerce_query(
-        question: str,
-) -> str:
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        temperature=0,
-        openai_api_key=openai_api_key,
-        streaming=False
-    )
-
-    docs_from_vdb = chatvec.search(
-        query=question,
-        top_k=4,
-    )
+def build_answer_chain(docs_from_vdb):
+    llm = get_chat_model("gpt-4o", temperature=0)
 
     context = ""
     for i, res in enumerate(docs_from_vdb):
         replaced_text = res['text'].replace('\n', ' ')
         context += f"Document Index: {i + 1}, {replaced_text}\n"
 
-    conversational_qa_chain = (
+    return (
             {
                 "context": lambda x: context,
                 "question": RunnablePassthrough(),
@@ -44,6 +32,17 @@ def ecommerce_query(
             | StrOutputParser()
     )
 
+
+def ecommerce_query(
+        question: str,
+) -> str:
+    docs_from_vdb = chatvec.search(
+        query=question,
+        top_k=4,
+        mode="hybrid",
+    )
+    conversational_qa_chain = build_answer_chain(docs_from_vdb)
+
     answer = ""
     for chunk in conversational_qa_chain.stream(
             {"question": question}
@@ -51,3 +50,23 @@ def ecommerce_query(
         answer += chunk
 
     return answer
+
+
+async def aecommerce_query(
+        question: str,
+) -> str:
+    """Async ecommerce_query(), for the event-loop request path."""
+    docs_from_vdb = await chatvec.asearch(
+        query=question,
+        top_k=4,
+        mode="hybrid",
+    )
+    conversational_qa_chain = build_answer_chain(docs_from_vdb)
+
+    answer = ""
+    async for chunk in conversational_qa_chain.astream(
+            {"question": question}
+    ):
+        answer += chunk
+
+    return answer
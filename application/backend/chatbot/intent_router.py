@@ -0,0 +1,231 @@
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+PRODUCT_AGENT = "product_selection_agent"
+ECOMMERCE_AGENT = "ecommerce_agent"
+FINISH = "FINISH"
+
+# Cosine similarity the nearest centroid needs, and its lead over the runner-up
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.35"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+
+# Whole-word keywords that point at one domain only
+PRODUCT_KEYWORDS = re.compile(
+    r"\b(?:mcus?|microcontrollers?|chips?|(?:cortex[\s-]?)?m\d+\w*|arm9|8051|risc-?v|nuvoton|numicro|flash|sram|"
+    r"aprom|ldrom|adcs?|dacs?|gpios?|uarts?|spi|i2c|i²c|i2s|usb|can(?:\s|-)?fd|ethernet|pwm|qei|trustzone|"
+    r"mhz|ghz|lqfp\d*|qfn\d*|tssop\d*|packages?|datasheets?|aec-q100|automotive grade|operating (?:voltage|"
+    r"temperature|frequency)|evaluation boards?|part numbers?)\b",
+    re.IGNORECASE,
+)
+ECOMMERCE_KEYWORDS = re.compile(
+    r"\b(?:e-?commerce|prestashop|web ?shop|online (?:shop|store)|my (?:shop|store|site|website)|storefront|"
+    r"back ?office|carts?|checkout|orders? status|customers?|payment (?:module|methods?|gateway)|shipping|"
+    r"carriers?|vouchers?|discounts?|coupons?|themes?|modules?|seo|catalog(?:ue)?|invoices?|stock management)\b",
+    re.IGNORECASE,
+)
+
+# Title and reason shown to the user for a local decision, like the LLM router's
+ROUTE_EXPLANATIONS = {
+    PRODUCT_AGENT: ("Looking up matching products",
+                    "The question is about choosing or checking chip products, so I will look up the matching "
+                    "parts and their parameters in the product database."),
+    ECOMMERCE_AGENT: ("Checking the e-commerce guide",
+                      "The question is about running the online shop, so I will look up the relevant steps and "
+                      "settings in the e-commerce documentation."),
+    FINISH: ("Answering directly",
+             "The question does not need any product data or e-commerce documentation, so I can answer it "
+             "directly."),
+}
+# Shown when a turn finishes because every task has been answered
+ANSWERED_EXPLANATION = ("Putting the answer together",
+                        "I now have findings for every part of the question, so I will put them together into "
+                        "the final reply.")
+
+# Seed questions for the nearest-centroid stage
+ROUTE_EXAMPLES = {
+    PRODUCT_AGENT: [
+        "Recommend a low power microcontroller with at least 64 KB of flash",
+        "Which chips have a Cortex-M4 core and run above 100 MHz?",
+        "What is the operating voltage range of this part?",
+        "Find products with CAN FD and a 12-bit ADC",
+        "I need an MCU for motor control in an LQFP48 package",
+        "Compare the SRAM and GPIO count of these two parts",
+        "Which parts are suitable for automotive applications?",
+        "Show me chips with USB high speed and Ethernet",
+    ],
+    ECOMMERCE_AGENT: [
+        "How do I add a new product to my online store?",
+        "How can I configure shipping carriers and delivery fees?",
+        "Set up a discount voucher for returning customers",
+        "How do I install a payment module?",
+        "Change the theme of the shop front page",
+        "How do I import products from a CSV file into the catalog?",
+        "Where can I see and update the status of an order?",
+        "How do I enable multiple currencies on the website?",
+    ],
+    FINISH: [
+        "Hello, who are you?",
+        "Thanks, that's all I needed",
+        "What's the weather like today?",
+        "Tell me a joke",
+        "Good morning!",
+        "What can you help me with?",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    First-stage router that answers obvious routing decisions without an LLM.
+
+    Stage one is rules: a known part number or product keywords route to the
+    product-selection agent, e-commerce keywords to the e-commerce agent.
+    Questions that hit neither go to stage two, which compares the question
+    embedding with the centroid of each route's seed questions; questions that
+    hit both are left to the LLM, which splits them into parallel tasks.
+    When neither stage is confident, route() returns None and the caller falls
+    back to the LLM router; record() collects per-stage decision counts and
+    latency for all three.
+    """
+
+    def __init__(self, find_parts=None, embed=None, examples=None, min_similarity=ROUTER_MIN_SIMILARITY,
+                 min_margin=ROUTER_MIN_MARGIN):
+        self.find_parts = find_parts
+        self.embed = embed
+        self.examples = ROUTE_EXAMPLES if examples is None else examples
+        self.labels = list(self.examples)
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.lock = threading.Lock()
+        self.centroids = None
+        self.stats = {}
+
+    def _ensure_centroids(self):
+        if self.centroids is not None:
+            return self.centroids
+        # Embedded without the lock, so counters and other routes are not held up by the API call;
+        # concurrent first calls may each compute them, and the first one published is kept
+        centroids = []
+        for label in self.labels:
+            vectors = np.asarray(self.embed(self.examples[label]), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        with self.lock:
+            if self.centroids is None:
+                self.centroids = np.stack(centroids)
+            return self.centroids
+
+    def by_rules(self, question, follow_up=False):
+        """
+        Route from part numbers and keywords; a part number wins unless the
+        question is also about the shop.
+
+        Args:
+            question (str): The user's message.
+            follow_up (bool): The message continues an earlier exchange; only a
+                part number is then specific enough to act on alone.
+
+        Returns:
+            str: An agent name, or None when the rules are not conclusive.
+        """
+        ecommerce = ECOMMERCE_KEYWORDS.search(question) is not None
+        if self.find_parts is not None and self.find_parts(question) and not ecommerce:
+            return PRODUCT_AGENT
+        if follow_up:
+            return None
+        product = PRODUCT_KEYWORDS.search(question) is not None
+        if product != ecommerce:
+            return PRODUCT_AGENT if product else ECOMMERCE_AGENT
+        return None
+
+    @staticmethod
+    def mixed(question):
+        """Whether the question touches both domains; the LLM splits those into tasks."""
+        return PRODUCT_KEYWORDS.search(question) is not None and ECOMMERCE_KEYWORDS.search(question) is not None
+
+    def by_centroid(self, question):
+        """
+        Route to the nearest centroid of the seed questions.
+
+        Returns:
+            tuple: (route, similarity), or None when the match is too weak or
+            too close to the runner-up, or embeddings are unavailable.
+        """
+        if self.embed is None:
+            return None
+        try:
+            centroids = self._ensure_centroids()
+            query = np.asarray(self.embed([question])[0], dtype=np.float32)
+        except Exception as e:
+            print(f"Centroid routing skipped: {e}")
+            return None
+        scores = centroids @ (query / np.linalg.norm(query))
+        order = np.argsort(scores)[::-1]
+        best, runner_up = float(scores[order[0]]), float(scores[order[1]])
+        if best < self.min_similarity or best - runner_up < self.min_margin:
+            return None
+        return self.labels[order[0]], best
+
+    def route(self, question, follow_up=False):
+        """
+        Try the local stages in order.
+
+        Returns:
+            tuple: (route, stage), where stage is "rules" or "centroid", or
+            None when the LLM router has to decide.
+        """
+        start = time.perf_counter()
+        decision = None
+        route = self.by_rules(question, follow_up)
+        if route is not None:
+            decision = route, "rules"
+        elif not follow_up and not self.mixed(question):
+            match = self.by_centroid(question)
+            if match is not None:
+                decision = match[0], "centroid"
+        self.record("local", None if decision is None else decision[0], time.perf_counter() - start,
+                    decided=decision is not None, stage=None if decision is None else decision[1])
+        return decision
+
+    def record(self, kind, route, seconds, decided=True, stage=None):
+        """
+        Count one routing attempt.
+
+        Args:
+            kind (str): "local" for route() calls, or the name of a stage
+                decided outside this class (e.g. "llm").
+            route (str): The chosen route, if any.
+            seconds (float): Time the attempt took.
+            decided (bool): Whether the attempt produced the decision.
+            stage (str): Deciding stage of a local attempt.
+        """
+        with self.lock:
+            timing = self.stats.setdefault(f"{kind}_ms", {"count": 0, "total": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds * 1000
+            if decided:
+                key = stage or kind
+                stage_stats = self.stats.setdefault(key, {"decisions": 0, "routes": {}})
+                stage_stats["decisions"] += 1
+                stage_stats["routes"][route] = stage_stats["routes"].get(route, 0) + 1
+
+    def summary(self):
+        """Decisions per stage and the LLM routing time the local stages saved."""
+        with self.lock:
+            stats = {key: dict(value) for key, value in self.stats.items()}
+        local = stats.get("local_ms", {"count": 0, "total": 0.0})
+        llm = stats.get("llm_ms", {"count": 0, "total": 0.0})
+        local_decisions = sum(stats.get(stage, {}).get("decisions", 0) for stage in ("rules", "centroid", "answered"))
+        llm_mean = llm["total"] / llm["count"] if llm["count"] else None
+        stats["local_decisions"] = local_decisions
+        stats["llm_decisions"] = stats.get("llm", {}).get("decisions", 0)
+        stats["mean_llm_route_ms"] = llm_mean
+        stats["mean_local_route_ms"] = local["total"] / local["count"] if local["count"] else None
+        # Every local decision replaced one LLM routing call
+        stats["saved_ms"] = None if llm_mean is None else local_decisions * llm_mean - local["total"]
+        return stats
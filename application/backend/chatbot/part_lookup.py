@@ -0,0 +1,171 @@
+import difflib
+import re
+
+# Words a plain lookup question is made of besides part numbers and attributes
+STOPWORDS = {
+    "a", "about", "all", "amount", "an", "and", "any", "are", "can", "could", "count", "detail", "details", "do",
+    "does", "for", "get", "give", "has", "have", "how", "i", "in", "info", "information", "is", "it", "its", "know",
+    "list", "many", "max", "maximum", "me", "min", "minimum", "much", "need", "number", "of", "on", "operate",
+    "operating", "or", "parameter", "parameters", "part", "parts", "please", "product", "products",
+    "provide", "range", "show", "size", "spec", "specs", "support", "supported", "supports", "tell",
+    "the", "their", "them", "these", "this", "those", "to", "value", "values", "want", "what", "whats",
+    "with", "you",
+}
+# Everyday names for parameters whose column names do not contain them
+ATTRIBUTE_SYNONYMS = {
+    "frequency": ["Operating_Frequency"],
+    "speed": ["Operating_Frequency"],
+    "clock speed": ["Operating_Frequency"],
+    "mhz": ["Operating_Frequency"],
+    "temperature": ["Operating_Temperature__min_", "Operating_Temperature__max_"],
+    "temp": ["Operating_Temperature__min_", "Operating_Temperature__max_"],
+    "voltage": ["Operating_Voltage___min_", "Operating_Voltage__max_"],
+    "flash": ["Application_ROM__APROM__Flash"],
+    "rom": ["Application_ROM__APROM__Flash"],
+    "ram": ["SRAM"],
+    "memory": ["Application_ROM__APROM__Flash", "SRAM"],
+    "package": ["Package_Type", "Package_Size"],
+    "family": ["NuMicro_Family"],
+    "series": ["Product_Series"],
+    "cpu": ["Core"],
+    "pins": ["GPIO"],
+    "io": ["GPIO"],
+    "i2c": ["I²C"],
+    "i2s": ["I²S"],
+    "evaluation board": ["Evaluation_Board___Part_No._", "Evaluation_Board__Ordering_No._"],
+}
+# Trailing "(RTC)" / "(min)" of a column name, kept as "__RTC_" by the cleaning step
+ABBREVIATION_PATTERN = re.compile(r"__([^\W_]+)_$")
+QUALIFIERS = {"min", "max", "text"}
+WORD_PATTERN = re.compile(r"[^\W_]+")
+PART_PATTERN = re.compile(r"[\w\-./]+")
+MAX_PHRASE_WORDS = 6
+FUZZY_CUTOFF = 0.8
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+class PartLookup:
+    """
+    Deterministic parser for "give me X, Y and Z of part M032LG8AE" questions.
+
+    Part numbers are matched against the set of Part_No values; attribute
+    words are mapped to columns through an alias index built from the cleaned
+    column names, their abbreviations and a few synonyms, with difflib as a
+    fallback for misspellings. Anything the parser cannot account for makes
+    parse() return None so the question goes to the LLM instead.
+    """
+
+    def __init__(self, part_numbers, columns):
+        self.parts = {part.upper(): part for part in part_numbers if part}
+        self.columns = list(columns)
+        # alias phrase -> columns, e.g. "operating temperature" -> [min, max]
+        self.aliases = {}
+        for column in self.columns:
+            if column.endswith("_text") or column == "Part_No":
+                continue
+            for alias in self._column_aliases(column):
+                self._add_alias(alias, column)
+        for alias, targets in ATTRIBUTE_SYNONYMS.items():
+            for column in targets:
+                if column in self.columns:
+                    self._add_alias(alias, column)
+        self.aliases_by_length = {}
+        for alias in self.aliases:
+            self.aliases_by_length.setdefault(len(alias.split()), []).append(alias)
+
+    @staticmethod
+    def _column_aliases(column):
+        aliases = {" ".join(words(column))}
+        abbreviation = ABBREVIATION_PATTERN.search(column)
+        if abbreviation:
+            base = words(column[:abbreviation.start()])
+            if abbreviation.group(1).lower() in QUALIFIERS:
+                aliases.add(" ".join(base))
+            else:
+                aliases.update({" ".join(base), abbreviation.group(1).lower()})
+        return {alias for alias in aliases if alias}
+
+    def _add_alias(self, alias, column):
+        targets = self.aliases.setdefault(alias, [])
+        if column not in targets:
+            targets.append(column)
+
+    def find_parts(self, question):
+        """Known part numbers in the question, in order of appearance."""
+        found = []
+        for token in PART_PATTERN.findall(question):
+            part = self.parts.get(token.strip("-./").upper())
+            if part is not None and part not in found:
+                found.append(part)
+        return found
+
+    def _match(self, tokens, start):
+        """Longest alias starting at tokens[start]: (columns, words consumed) or None."""
+        longest = min(MAX_PHRASE_WORDS, len(tokens) - start)
+        for n in range(longest, 0, -1):
+            phrase = " ".join(tokens[start:start + n])
+            # A lone stopword such as "can" is not the CAN column
+            if n == 1 and phrase in STOPWORDS:
+                return None
+            if phrase in self.aliases:
+                return self.aliases[phrase], n
+        for n in range(longest, 0, -1):
+            phrase_tokens = tokens[start:start + n]
+            if any(token in STOPWORDS for token in phrase_tokens):
+                continue
+            close = difflib.get_close_matches(" ".join(phrase_tokens), self.aliases_by_length.get(n, []),
+                                              n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                return self.aliases[close[0]], n
+        return None
+
+    def parse(self, question):
+        """
+        Parse a lookup question.
+
+        Returns:
+            tuple: (part numbers, columns) with the columns in the order they
+            were asked for (empty means every column), or None when the
+            question is not a plain lookup of known parts.
+        """
+        parts = self.find_parts(question)
+        if not parts:
+            return None
+        part_words = {word for part in parts for word in words(part)}
+        tokens = [token for token in words(question) if token not in part_words]
+
+        columns = []
+        i = 0
+        while i < len(tokens):
+            match = self._match(tokens, i)
+            if match is None:
+                if tokens[i] not in STOPWORDS:
+                    return None
+                i += 1
+                continue
+            self._extend(columns, match[0])
+            i += match[1]
+        return parts, columns
+
+    def mentioned_columns(self, question):
+        """Columns a question refers to by name or synonym; unmatched words are ignored."""
+        tokens = words(question)
+        columns = []
+        i = 0
+        while i < len(tokens):
+            match = self._match(tokens, i)
+            if match is None:
+                i += 1
+                continue
+            self._extend(columns, match[0])
+            i += match[1]
+        return columns
+
+    def _extend(self, columns, matched):
+        for column in matched:
+            for name in (column, f"{column}_text"):
+                if name in self.columns and name not in columns:
+                    columns.append(name)
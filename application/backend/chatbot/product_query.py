@@ -1,15 +1,28 @@
+import asyncio
+import functools
+import hashlib
 import json
+import math
 import os
 import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 import pandas as pd
 from dotenv import load_dotenv
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
 
+from application.backend.chatbot.clients import get_chat_model, get_openai_client
+from application.backend.chatbot.column_selector import ColumnSelector, store_column_embeddings
+from application.backend.chatbot.part_lookup import STOPWORDS, PartLookup
 from application.backend.chatbot.prompts import PRODUCT_QUERY_PROMPT
+from application.backend.chatbot.sql_cache import SQL_CACHE_SEMANTIC, SqlCache, schema_hash
+from application.backend.chatbot.sql_guard import SqlGuard
+from application.backend.datastore.embedding_cache import get_embedding_cache
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -17,6 +30,36 @@ FILE_PATH = os.path.join(BASE_DIR, "data", "Product_Selection_Guide.xlsx")
 DB_PATH = os.path.join(BASE_DIR, "data", "products.db")
 SHEET_NAME = "Product Selection Table"
 TABLE_NAME = "product_parameters"
+# Bytes of the database file each read connection may memory-map
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+BUILD_INFO_TABLE = "build_info"
+# Bumped when the build produces new tables or columns, forcing a rebuild of older databases
+BUILD_VERSION = "2"
+# FTS5 index over the descriptive columns, rowid-aligned with the product table
+SEARCH_TABLE = "product_search"
+SEARCH_COLUMNS = ["Application", "Core", "NuMicro_Family", "Product_Series", "Package_Type"]
+# Hard cap on rows returned to the agent; more are flagged, not serialized
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "50"))
+SQLITE_WORKERS = int(os.getenv("SQLITE_WORKERS", "8"))
+QUESTION_EMBEDDING_MODEL = "text-embedding-3-small"
+QUERY_ERROR = "Error executing the query."
+
+# Columns that keep their text even when they look numeric
+TEXT_COLUMNS = {"Part_No", "Product_Series", "NuMicro_Family", "Package_Size"}
+# Share of non-empty values that must parse for a column to become numeric
+NUMERIC_THRESHOLD = 0.9
+# Most-filtered parameters, indexed along with Part_No
+INDEXED_COLUMNS = [
+    "Part_No", "Core", "Application", "Package_Type", "NuMicro_Family", "Product_Series",
+    "Operating_Frequency", "Application_ROM__APROM__Flash", "SRAM",
+    "Operating_Temperature__min_", "Operating_Temperature__max_",
+    "Operating_Voltage___min_", "Operating_Voltage__max_", "GPIO",
+]
+
+# "72", "256 B", "4 MB", "105 (Tj)": a number with an optional unit or footnote
+NUMBER_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)\s*(B|KB|MB|K|M|MHz|V)?\s*(?:\(\w+\))?$", re.IGNORECASE)
+# Byte-denominated memory sizes are converted to KB, the unit of the memory columns
+UNIT_SCALE = {"b": 1 / 1024, "mb": 1024}
 
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -42,10 +85,170 @@ def load_and_clean_excel(file_path, sheet_name):
     return product_data
 
 
-def save_to_database(data, db_path, table_name="product_parameters"):
-    conn = sqlite3.connect(db_path)
-    data.to_sql(table_name, conn, if_exists="replace", index=False)
-    conn.close()
+def parse_number(value):
+    """
+    Parse a workbook cell into a number.
+
+    Returns:
+        tuple: (number or None, exact). `exact` is False when information was
+        dropped: "16 or 24" becomes the maximum 24, "1 and 256B" the sum of its
+        parts in KB, and unparseable text becomes None.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None, True
+    if isinstance(value, (int, float)):
+        return float(value), True
+    text = str(value).strip()
+    if text in ("", "-"):
+        return None, True
+
+    def parse_part(part):
+        match = NUMBER_PATTERN.match(part.strip())
+        if match is None:
+            return None
+        return float(match.group(1)) * UNIT_SCALE.get((match.group(2) or "").lower(), 1)
+
+    number = parse_part(text)
+    if number is not None:
+        return number, True
+    for separator, combine in ((" or ", max), (" and ", sum)):
+        if separator in text:
+            parts = [parse_part(part) for part in text.split(separator)]
+            if all(part is not None for part in parts):
+                return combine(parts), False
+    return None, False
+
+
+def type_columns(data):
+    """
+    Decide the SQLite type of every column and convert its values.
+
+    Mostly-numeric columns become INTEGER or REAL. When the conversion is
+    lossy for some rows, the original text is kept in a `<column>_text`
+    column. Feature flags are normalized to lowercase "v".
+
+    Returns:
+        list: (column name, SQL type, values) tuples in table order.
+    """
+    columns = []
+    for name in data.columns:
+        values = [None if pd.isna(v) else v for v in data[name].tolist()]
+        present = [v for v in values if v is not None and str(v).strip() not in ("", "-")]
+        parsed = [parse_number(v) for v in values]
+        parseable = sum(1 for v, (number, _) in zip(values, parsed) if number is not None)
+
+        if name not in TEXT_COLUMNS and present and parseable / len(present) >= NUMERIC_THRESHOLD:
+            numbers = [number for number, _ in parsed]
+            integral = all(n is None or n.is_integer() for n in numbers)
+            if integral:
+                numbers = [None if n is None else int(n) for n in numbers]
+            columns.append((name, "INTEGER" if integral else "REAL", numbers))
+            if not all(exact for _, exact in parsed):
+                columns.append((f"{name}_text", "TEXT", [None if v is None else str(v) for v in values]))
+            continue
+
+        if present and all(str(v).strip().lower() in ("v", "-") for v in present):
+            values = [None if v is None else str(v).strip().lower() for v in values]
+        columns.append((name, "TEXT", [None if v is None else str(v).strip() for v in values]))
+    return columns
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_build_info(conn):
+    try:
+        return dict(conn.execute(f"SELECT key, value FROM {BUILD_INFO_TABLE}").fetchall())
+    except sqlite3.Error:
+        return {}
+
+
+def save_to_database(data, db_path, table_name="product_parameters", source_hash=None, embed=None):
+    """
+    Write the product table with typed columns and indexes.
+
+    The new table is built under a staging name and swapped in with DROP +
+    RENAME in the same transaction. In WAL mode, readers keep seeing the old
+    table until the commit and then the complete new one. Column descriptions
+    (and their embeddings, when `embed` is given) are stored afterwards for
+    schema pruning.
+    """
+    columns = type_columns(data)
+    staging = f"{table_name}_staging"
+    column_sql = ", ".join(f'"{name}" {sql_type}' for name, sql_type, _ in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    rows = zip(*(values for _, _, values in columns))
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            conn.execute(f'CREATE TABLE "{staging}" ({column_sql})')
+            conn.executemany(f'INSERT INTO "{staging}" VALUES ({placeholders})', rows)
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{table_name}"')
+
+            names = {name for name, _, _ in columns}
+            for name in INDEXED_COLUMNS:
+                if name in names:
+                    conn.execute(f'CREATE INDEX "idx_{table_name}_{name}" ON "{table_name}" ("{name}")')
+
+            create_search_index(conn, table_name, columns)
+
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {BUILD_INFO_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {BUILD_INFO_TABLE} (key, value) VALUES (?, ?)",
+                [("source_sha256", source_hash or ""), ("built_at", str(time.time())),
+                 ("build_version", BUILD_VERSION)],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("ANALYZE")
+        store_column_embeddings(conn, table_name, [name for name, _, _ in columns], embed)
+    finally:
+        conn.close()
+
+
+def create_search_index(conn, table_name, columns):
+    """
+    (Re)create the FTS5 table used for loose descriptive searches.
+
+    Indexes the descriptive text columns plus a Features column listing the
+    readable names of the peripherals and features each product has (flag
+    columns set to "v" and non-zero integer counts). Rows share their rowid
+    with the product table. Runs inside the caller's transaction.
+    """
+    names = {name for name, _, _ in columns}
+    indexed = [name for name in SEARCH_COLUMNS if name in names] + ["Features"]
+    features = [
+        name for name, sql_type, values in columns
+        if name not in INDEXED_COLUMNS and not name.startswith("Operating_")
+        and (sql_type == "INTEGER" or (sql_type == "TEXT" and "v" in values))
+    ]
+    column_list = ", ".join(f'"{name}"' for name in indexed)
+
+    conn.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+    conn.execute(f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" USING fts5({column_list}, prefix="2 3")')
+    selected = ", ".join(f'"{name}"' for name in indexed[:-1] + features)
+    search_rows = []
+    for row in conn.execute(f'SELECT rowid, {selected} FROM "{table_name}"'):
+        descriptive, flags = row[1:len(indexed)], row[len(indexed):]
+        feature_text = ", ".join(
+            " ".join(name.replace("_", " ").split())
+            for name, value in zip(features, flags) if value == "v" or (isinstance(value, int) and value > 0)
+        )
+        search_rows.append((row[0], *descriptive, feature_text))
+    placeholders = ", ".join("?" for _ in range(len(indexed) + 1))
+    conn.executemany(f'INSERT INTO "{SEARCH_TABLE}" (rowid, {column_list}) VALUES ({placeholders})', search_rows)
 
 
 def is_database_ready(db_path, table_name):
@@ -61,31 +264,229 @@ def is_database_ready(db_path, table_name):
         return False
 
 
-def query_database(db_path, query):
-    conn = sqlite3.connect(db_path)
+class ProductStore:
+    """
+    Long-lived access to the product database.
+
+    Created once per process. Each thread gets its own read-only connection
+    (WAL, memory-mapped I/O), and the readiness check and column list are
+    cached. The database is rebuilt from the Excel file only when the
+    workbook's content hash differs from the one recorded at build time;
+    connections are reopened whenever the database changes.
+    """
+
+    def __init__(self, db_path=DB_PATH, source_path=FILE_PATH, sheet_name=SHEET_NAME, table_name=TABLE_NAME):
+        self.db_path = db_path
+        self.source_path = source_path
+        self.sheet_name = sheet_name
+        self.table_name = table_name
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Bumped whenever the database file changes, invalidating thread connections
+        self.generation = 0
+        self.signature = None
+        self.columns = []
+        # Changes whenever the table is rebuilt; keys the NL-to-SQL cache
+        self.schema_hash = None
+        # Part-number lookup parser over the current Part_No values and columns
+        self.part_lookup = PartLookup([], [])
+        # Picks the columns shown to the SQL generator
+        self.column_selector = ColumnSelector([], {})
+
+    @staticmethod
+    def _file_signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def ensure_ready(self):
+        """
+        Make sure the table exists and is current; cheap when nothing changed.
+
+        Only stat() calls are made on the hot path. The WAL file size is part of
+        the signature because commits land there before being checkpointed.
+        """
+        signature = self._signature()
+        if signature == self.signature:
+            return
+        with self.lock:
+            if signature[0] is not None and self._source_changed():
+                print("Database or table missing or outdated. Regenerating from Excel file.")
+                data = load_and_clean_excel(self.source_path, self.sheet_name)
+                save_to_database(data, self.db_path, self.table_name, source_hash=file_sha256(self.source_path),
+                                 embed=embed_texts if openai_api_key else None)
+            signature = self._signature()
+
+            self.generation += 1
+            conn = self._open()
+            try:
+                self.columns = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table_name});")]
+                self.schema_hash = schema_hash(self.columns, read_build_info(conn))
+                part_numbers = [row[0] for row in conn.execute(f"SELECT Part_No FROM {self.table_name}")]
+                self.part_lookup = PartLookup(part_numbers, self.columns)
+                self.column_selector = ColumnSelector.from_connection(
+                    conn, self.table_name, self.columns, embed=embed_texts if openai_api_key else None,
+                    mentioned=self.part_lookup.mentioned_columns,
+                )
+            finally:
+                conn.close()
+            self.signature = signature
+
+    def _signature(self):
+        # Readers create and touch the WAL file, so only its size signals a commit
+        wal_path = self.db_path + "-wal"
+        wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return self._file_signature(self.source_path), self._file_signature(self.db_path), wal_size
+
+    def _source_changed(self):
+        """True if the table is missing, outdated or was built from a different workbook."""
+        if not is_database_ready(self.db_path, self.table_name):
+            return True
+        conn = sqlite3.connect(self.db_path)
+        try:
+            build_info = read_build_info(conn)
+        finally:
+            conn.close()
+        return (build_info.get("build_version") != BUILD_VERSION
+                or build_info.get("source_sha256") != file_sha256(self.source_path))
+
+    def _open(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA query_only=1")
+        # Connect the FTS5 table now: its first use updates sqlite_master, which SqlGuard denies
+        conn.execute(f'SELECT 1 FROM "{SEARCH_TABLE}" LIMIT 0')
+        return conn
+
+    def current_part_lookup(self):
+        """Part-number lookup over the current table."""
+        self.ensure_ready()
+        return self.part_lookup
+
+    def connection(self):
+        """Read-only connection owned by the calling thread."""
+        self.ensure_ready()
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.generation != self.generation:
+            if conn is not None:
+                conn.close()
+            conn = self._open()
+            self.local.conn = conn
+            self.local.generation = self.generation
+        return conn
+
+
+def serialize_rows(columns, rows, more_rows):
+    """
+    Compact columnar JSON for a result set.
+
+    Columns that are NULL in every returned row are dropped from "columns" and
+    "rows" and listed in "omitted_null_columns", so a selected value that is
+    not available stays distinguishable from one that was not selected. Floats
+    that are whole numbers are written as integers, and no whitespace is
+    emitted.
+    """
+    values_by_column = list(zip(*rows)) if rows else [() for _ in columns]
+    kept = []
+    omitted = []
+    for name, values in zip(columns, values_by_column):
+        if any(value is not None for value in values):
+            kept.append((name, values))
+        elif rows:
+            omitted.append(name)
+    kept_rows = [
+        [int(v) if isinstance(v, float) and v.is_integer() else v for v in row]
+        for row in zip(*(values for _, values in kept))
+    ]
+    return json.dumps({
+        "columns": [name for name, _ in kept],
+        "rows": kept_rows,
+        "omitted_null_columns": omitted,
+        "row_count": len(rows),
+        "more_rows_available": more_rows,
+    }, ensure_ascii=False, separators=(",", ":"))
+
+
+def query_database(conn, query, max_rows=MAX_RESULT_ROWS, parameters=(), guard=None):
+    """
+    Run a query and serialize at most `max_rows` rows.
+
+    Rows are pulled from the cursor only up to the cap (plus one, to know
+    whether more exist), so a loose query never materializes the catalogue.
+    Untrusted (LLM-generated) SQL should be passed with a SqlGuard, which
+    validates it and bounds its run time.
+    """
     try:
+        if guard is not None:
+            query = guard.prepare(conn, query, max_rows + 1)
         print(f"Executing SQL Query: {query}")
-        product_result = pd.read_sql(query, conn)
-        result_json = [
-            {col: row for col, row in row_data.items() if pd.notna(row)}
-            for _, row_data in product_result.iterrows()
-        ]
-        result_string = json.dumps(result_json, indent=2)
+        with guard.budget(conn) if guard is not None else nullcontext():
+            cursor = conn.execute(query, parameters)
+            try:
+                rows = cursor.fetchmany(max_rows + 1)
+                columns = [description[0] for description in cursor.description or []]
+            finally:
+                cursor.close()
+        result_string = serialize_rows(columns, rows[:max_rows], len(rows) > max_rows)
     except Exception as e:
         print(f"Error executing query: {e}")
-        result_string = "Error executing the query."
-    conn.close()
+        result_string = QUERY_ERROR
     return result_string
 
 
-def generate_sql_query(query, column_mapping, table_name):
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        temperature=0,
-        openai_api_key=openai_api_key,
-        streaming=False
+def lookup_parts(conn, part_numbers, columns, table_name=TABLE_NAME):
+    """
+    Parameterized SELECT of the given columns (all when empty) for known parts.
+
+    Used for questions the PartLookup parser fully understood, skipping the
+    LLM round trip.
+    """
+    if columns:
+        selected = ", ".join(f'"{name}"' for name in ["Part_No"] + [c for c in columns if c != "Part_No"])
+    else:
+        selected = "*"
+    placeholders = ", ".join("?" for _ in part_numbers)
+    query = f"SELECT {selected} FROM {table_name} WHERE Part_No IN ({placeholders})"
+    return query_database(conn, query, parameters=tuple(part_numbers))
+
+
+def search_expression(text, any_term=False):
+    """
+    FTS5 MATCH expression for a loose description.
+
+    Every remaining word becomes a quoted prefix term, so user input cannot
+    inject FTS syntax; terms are ANDed unless `any_term` is set.
+    """
+    terms = [word for word in re.findall(r"[^\W_]+", text.lower()) if word not in STOPWORDS]
+    return (" OR " if any_term else " ").join(f'"{term}"*' for term in terms)
+
+
+def search_products(conn, text, max_rows=MAX_RESULT_ROWS, table_name=TABLE_NAME):
+    """
+    Products matching a loose description such as "low power Cortex-M23".
+
+    Uses the FTS5 index ranked by bm25 and joins back to the product table.
+    Products matching every word are preferred; when there are none, any
+    word may match. Returns the same serialized form as query_database().
+    """
+    query = (
+        f'SELECT p.* FROM "{SEARCH_TABLE}" JOIN "{table_name}" p ON p.rowid = "{SEARCH_TABLE}".rowid '
+        f'WHERE "{SEARCH_TABLE}" MATCH ? ORDER BY bm25("{SEARCH_TABLE}")'
     )
-    sequence = (
+    expression = search_expression(text)
+    if not expression:
+        return serialize_rows([], [], False)
+    result = query_database(conn, query, max_rows, parameters=(expression,))
+    if result != QUERY_ERROR and json.loads(result)["row_count"] == 0:
+        result = query_database(conn, query, max_rows, parameters=(search_expression(text, any_term=True),))
+    return result
+
+
+def build_sql_chain(column_mapping, table_name):
+    llm = get_chat_model("gpt-4o", temperature=0)
+    return (
             {
                 "question": RunnablePassthrough(),
                 "columns": lambda _: ", ".join(column_mapping),
@@ -95,34 +496,124 @@ def generate_sql_query(query, column_mapping, table_name):
             | llm
             | StrOutputParser()
     )
-    sql_query = sequence.invoke({"question": query})
+
+
+def clean_sql(sql_query):
     sql_query = re.sub(r'^```sql\s*|```$', '', sql_query, flags=re.IGNORECASE | re.MULTILINE)
-    sql_query = sql_query.strip()
-    return sql_query
+    return sql_query.replace('```', '').strip()
 
 
-def process_user_query(query):
-    # Check if the database and table are ready
-    if not is_database_ready(DB_PATH, TABLE_NAME):
-        print("Database or table not found. Regenerating from Excel file.")
-        data = load_and_clean_excel(FILE_PATH, SHEET_NAME)
-        save_to_database(data, DB_PATH, TABLE_NAME)
-    else:
-        print("Database and table found. Skipping regeneration.")
+def generate_sql_query(query, column_mapping, table_name):
+    return clean_sql(build_sql_chain(column_mapping, table_name).invoke({"question": query}))
+
+
+async def agenerate_sql_query(query, column_mapping, table_name):
+    return clean_sql(await build_sql_chain(column_mapping, table_name).ainvoke({"question": query}))
+
 
-    conn = sqlite3.connect(DB_PATH)
-    column_mapping = pd.read_sql(f"PRAGMA table_info({TABLE_NAME});", conn)['name'].tolist()
-    conn.close()
+def embed_question(text):
+    """Embedding of a user question, for the semantic tier of the SQL cache."""
+    return embed_texts([text])[0]
 
-    sql_query = generate_sql_query(query, column_mapping, TABLE_NAME)
-    sql_query = sql_query.replace('```', '').strip()
 
-    product_result = query_database(DB_PATH, sql_query)
+def embed_texts(texts):
+    """
+    Embeddings of several texts through the shared cache.
+
+    All cache misses are embedded with a single API call.
+    """
+    cache = get_embedding_cache()
+    vectors = [cache.get(text, QUESTION_EMBEDDING_MODEL) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        response = get_openai_client().embeddings.create(
+            input=[texts[i] for i in missing], model=QUESTION_EMBEDDING_MODEL
+        )
+        for i, item in zip(missing, response.data):
+            vectors[i] = cache.put(texts[i], QUESTION_EMBEDDING_MODEL, item.embedding)
+    return vectors
+
+
+# Opened on first use; the API warms it up at startup
+product_store = ProductStore()
+sql_cache = SqlCache(embed=embed_question if SQL_CACHE_SEMANTIC else None)
+sql_guard = SqlGuard()
+# Worker threads for SQLite work on the async path; bounds concurrent queries
+db_executor = ThreadPoolExecutor(max_workers=SQLITE_WORKERS, thread_name_prefix="sqlite")
+
+
+def format_response(product_result):
     response = {
         "result": product_result,
-        "parameters": column_mapping[:20],
+        "parameters": product_store.columns[:20],
     }
-    return json.dumps(response, indent=2)
+    return json.dumps(response, ensure_ascii=False, separators=(",", ":"))
+
+
+def answer_without_llm(query):
+    """
+    Answer from the part-number lookup or the SQL cache when possible.
+
+    Returns:
+        tuple: (response, None) when answered, otherwise (None, the columns
+        to offer the SQL generator).
+    """
+    conn = product_store.connection()
+    lookup = product_store.part_lookup.parse(query)
+    if lookup is not None:
+        print(f"Answering from the part-number lookup: {lookup}")
+        return format_response(lookup_parts(conn, *lookup)), None
+
+    sql_query = sql_cache.lookup(query, product_store.schema_hash, conn)
+    if sql_query is not None:
+        return format_response(query_database(conn, sql_query, guard=sql_guard)), None
+    return None, product_store.column_selector.select(query)
+
+
+def run_generated_sql(query, sql_query):
+    """Execute freshly generated SQL and cache it if it ran."""
+    product_result = query_database(product_store.connection(), sql_query, guard=sql_guard)
+    if product_result != QUERY_ERROR:
+        sql_cache.store(query, product_store.schema_hash, sql_query)
+    return product_result
+
+
+def process_user_query(query):
+    response, prompt_columns = answer_without_llm(query)
+    if response is not None:
+        return response
+
+    product_result = run_generated_sql(query, generate_sql_query(query, prompt_columns, TABLE_NAME))
+    if product_result == QUERY_ERROR and len(prompt_columns) < len(product_store.columns):
+        # The pruned schema may have hidden a needed column; retry once with all of them
+        print("Retrying SQL generation with the full column list.")
+        product_result = run_generated_sql(query, generate_sql_query(query, product_store.columns, TABLE_NAME))
+    return format_response(product_result)
+
+
+async def run_in_db_executor(func, *args):
+    """Run blocking SQLite (and embedding lookup) work on the bounded database pool."""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, functools.partial(func, *args))
+
+
+async def aprocess_user_query(query):
+    """
+    Async process_user_query().
+
+    SQL generation awaits the model; every SQLite step runs on the bounded
+    db_executor pool, where each worker thread keeps its own connection.
+    """
+    response, prompt_columns = await run_in_db_executor(answer_without_llm, query)
+    if response is not None:
+        return response
+
+    sql_query = await agenerate_sql_query(query, prompt_columns, TABLE_NAME)
+    product_result = await run_in_db_executor(run_generated_sql, query, sql_query)
+    if product_result == QUERY_ERROR and len(prompt_columns) < len(product_store.columns):
+        print("Retrying SQL generation with the full column list.")
+        sql_query = await agenerate_sql_query(query, product_store.columns, TABLE_NAME)
+        product_result = await run_in_db_executor(run_generated_sql, query, sql_query)
+    return format_response(product_result)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "1024"))
+# The semantic tier is opt-in; questions must be at least this similar to reuse SQL
+SQL_CACHE_SEMANTIC = os.getenv("SQL_CACHE_SEMANTIC", "false").lower() == "true"
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "0.95"))
+
+# Part numbers, sizes, frequencies...: tokens that must match exactly for semantic reuse
+LITERAL_PATTERN = re.compile(r"[a-z_]*\d[\w.\-]*")
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class SqlCache:
+    """
+    Cache of SQL generated for product questions.
+
+    The exact tier is keyed on the normalized question. The optional semantic
+    tier reuses SQL for a near-duplicate question when the embeddings are
+    similar enough and both questions mention the same literals (part numbers,
+    sizes, frequencies). Every reused statement is checked with EXPLAIN first.
+    All entries belong to one schema hash and are dropped when it changes,
+    i.e. when the product database is rebuilt.
+    """
+
+    def __init__(self, max_entries=SQL_CACHE_SIZE, embed=None, similarity=SQL_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        self.schema_hash = None
+        # normalized question -> (sql, normalized embedding or None)
+        self.entries = OrderedDict()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalid": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _check_schema(self, schema_hash):
+        if schema_hash != self.schema_hash:
+            if self.entries:
+                self.stats["invalidations"] += 1
+            self.entries.clear()
+            self.schema_hash = schema_hash
+
+    def _embed(self, question):
+        vector = np.asarray(self.embed(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def validate(conn, sql):
+        """Cheap plan-only check that the statement still compiles against the schema."""
+        try:
+            conn.execute(f"EXPLAIN {sql}").fetchall()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def lookup(self, question, schema_hash, conn):
+        """
+        Return cached SQL for the question, or None.
+
+        Args:
+            question (str): User question.
+            schema_hash (str): Hash of the current product table schema/build.
+            conn (sqlite3.Connection): Connection used to validate the SQL.
+        """
+        key = normalize_question(question)
+        with self.lock:
+            self._check_schema(schema_hash)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            if self.validate(conn, entry[0]):
+                self._count("exact_hits")
+                return entry[0]
+            self._discard(key)
+
+        if self.embed is not None:
+            candidate = self._semantic_match(key)
+            if candidate is not None:
+                candidate_key, sql = candidate
+                if self.validate(conn, sql):
+                    self._count("semantic_hits")
+                    return sql
+                self._discard(candidate_key)
+
+        self._count("misses")
+        return None
+
+    def _semantic_match(self, key):
+        literals = set(LITERAL_PATTERN.findall(key))
+        with self.lock:
+            candidates = [(k, sql, emb) for k, (sql, emb) in self.entries.items()
+                          if emb is not None and set(LITERAL_PATTERN.findall(k)) == literals]
+        if not candidates:
+            return None
+        query = self._embed(key)
+        similarities = np.stack([emb for _, _, emb in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity:
+            return None
+        return candidates[best][0], candidates[best][1]
+
+    def _discard(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.stats["invalid"] += 1
+
+    def store(self, question, schema_hash, sql):
+        """Remember SQL that executed successfully for a question."""
+        key = normalize_question(question)
+        embedding = self._embed(key) if self.embed is not None else None
+        with self.lock:
+            self._check_schema(schema_hash)
+            self.entries[key] = (sql, embedding)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def schema_hash(columns, build_info):
+    """Hash of the column list and the workbook the table was built from."""
+    payload = "\0".join(columns) + "\0" + build_info.get("source_sha256", "") + build_info.get("built_at", "")
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
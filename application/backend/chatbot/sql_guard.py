@@ -0,0 +1,143 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SQL_TIMEOUT_SECONDS = float(os.getenv("SQL_TIMEOUT_SECONDS", "2"))
+SQL_MAX_VM_STEPS = int(os.getenv("SQL_MAX_VM_STEPS", "10000000"))
+# VM instructions between two progress-handler calls
+PROGRESS_INTERVAL = 1000
+
+# String literals, quoted identifiers and comments, blanked out before keyword checks
+QUOTED_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/",
+                               re.DOTALL)
+TRAILING_LIMIT = re.compile(r"\blimit\s+\d+(?:\s*(?:,|\boffset\b)\s*\d+)?\s*$", re.IGNORECASE)
+# Authorizer actions a read-only SELECT needs; everything else is denied at prepare time
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Issued internally by the FTS5 module while it reads its shadow tables. Its first use on a
+# connection also writes sqlite_master, so connections open their FTS5 tables before any statement is guarded
+ALLOWED_INTERNAL = {(sqlite3.SQLITE_PRAGMA, "data_version")}
+
+
+class SqlRejected(Exception):
+    """Raised when a statement is not allowed to run."""
+
+
+class SqlTimeout(Exception):
+    """Raised when a statement exceeds its wall-clock or VM-step budget."""
+
+
+def _authorize(action, arg1, *_):
+    if action in ALLOWED_ACTIONS or (action, arg1) in ALLOWED_INTERNAL:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+class SqlGuard:
+    """
+    Checks and budgets LLM-generated SQL before and while it runs.
+
+    A statement must be a single SELECT (or WITH ... SELECT); an authorizer
+    denies anything else when it is prepared. A LIMIT is appended when the
+    statement has none, and EXPLAIN QUERY PLAN rejects nested full scans (cross
+    joins and correlated subqueries that scan a table per outer row). While
+    running, a progress handler aborts the statement once it exceeds its
+    wall-clock or VM-instruction budget.
+    """
+
+    def __init__(self, timeout_seconds=SQL_TIMEOUT_SECONDS, max_vm_steps=SQL_MAX_VM_STEPS):
+        self.timeout_seconds = timeout_seconds
+        self.max_vm_steps = max_vm_steps
+        self.lock = threading.Lock()
+        self.stats = {"executed": 0, "rejected": 0, "timeouts": 0, "limits_added": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _reject(self, reason):
+        self._count("rejected")
+        raise SqlRejected(reason)
+
+    def prepare(self, conn, sql, max_rows):
+        """
+        Validate a statement and return the version that should be executed.
+
+        Args:
+            conn (sqlite3.Connection): Connection the statement will run on.
+            sql (str): Generated SQL.
+            max_rows (int): Rows the caller will read; the injected LIMIT.
+
+        Returns:
+            str: The statement, with a LIMIT appended if it had none.
+
+        Raises:
+            SqlRejected: If the statement is not a single SELECT or its plan
+                contains nested full scans.
+        """
+        sql = sql.strip().rstrip(";").strip()
+        bare = QUOTED_OR_COMMENT.sub(" ", sql)
+        if ";" in bare:
+            self._reject("multiple statements")
+        first_word = bare.split(None, 1)[0].upper() if bare.split() else ""
+        if first_word not in ("SELECT", "WITH"):
+            self._reject(f"only SELECT is allowed, got {first_word or 'an empty statement'}")
+        if not TRAILING_LIMIT.search(bare):
+            sql = f"{sql}\nLIMIT {max_rows}"
+            self._count("limits_added")
+
+        conn.set_authorizer(_authorize)
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        except sqlite3.DatabaseError as e:
+            self._reject(f"statement does not compile: {e}")
+        finally:
+            conn.set_authorizer(None)
+
+        reason = self.plan_problem(plan)
+        if reason:
+            self._reject(reason)
+        return sql
+
+    @staticmethod
+    def plan_problem(plan):
+        """Describe the first nested full scan in an EXPLAIN QUERY PLAN result, or return None."""
+        details = {row[0]: row[3] for row in plan}
+        scans_by_parent = {}
+        for node_id, parent, _, detail in plan:
+            if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+                continue
+            if details.get(parent, "").startswith("CORRELATED"):
+                return f"full scan inside a correlated subquery ({detail})"
+            scans_by_parent.setdefault(parent, []).append(detail)
+        for scans in scans_by_parent.values():
+            if len(scans) > 1:
+                return f"join of full scans ({', '.join(scans)})"
+        return None
+
+    @contextmanager
+    def budget(self, conn):
+        """Run the enclosed statement under the authorizer and time/step budget."""
+        deadline = time.perf_counter() + self.timeout_seconds
+        steps = [0]
+
+        def progress():
+            steps[0] += PROGRESS_INTERVAL
+            return steps[0] > self.max_vm_steps or time.perf_counter() > deadline
+
+        conn.set_authorizer(_authorize)
+        conn.set_progress_handler(progress, PROGRESS_INTERVAL)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                self._count("timeouts")
+                raise SqlTimeout(f"query stopped after {steps[0]:,} VM steps "
+                                 f"(limits: {self.timeout_seconds}s, {self.max_vm_steps:,} steps)") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.set_authorizer(None)
+        self._count("executed")
@@ -1,9 +1,22 @@
+import hashlib
 import os
-
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import tiktoken
 from PyPDF2 import PdfReader
 from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from azure.cosmos.partition_key import NonePartitionKeyValue
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAI, RateLimitError
+
+from application.backend.datastore.embedding_cache import get_embedding_cache
 
 # Configuration
 PDF_PATH = "User_manual.pdf"
@@ -15,51 +28,237 @@ COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DATABASE_NAME = os.getenv("COSMOS_DATABASE_NAME")
 COSMOS_CONTAINER_NAME = os.getenv("COSMOS_CONTAINER_NAME")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=openai_api_key)
-
-# Initialize Cosmos DB client
-cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-database = cosmos_client.get_database_client(COSMOS_DATABASE_NAME)
-container = database.get_container_client(COSMOS_CONTAINER_NAME)
-
-
-def get_embedding(text, model="text-embedding-3-large"):
-    """Get embeddings for a given text using OpenAI's GPT models."""
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Chunk size and overlap between consecutive chunks, in tokens
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+# Largest single input accepted by the embedding model
+MAX_INPUT_TOKENS = 8191
+# Per-request limits of the embeddings endpoint
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "300000"))
+# Embedding requests kept in flight, and retries on rate limits / transient errors
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+# Page extraction worker processes, pages handed to each worker at a time
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+EXTRACT_PAGES_PER_SHARD = int(os.getenv("EXTRACT_PAGES_PER_SHARD", "8"))
+# Chunks are embedded in groups of about this many tokens (or pages, whichever comes first) while
+# extraction continues; at most EMBED_GROUPS_IN_FLIGHT groups are buffered, which bounds peak memory
+EMBED_GROUP_TOKENS = int(os.getenv("EMBED_GROUP_TOKENS", "50000"))
+EMBED_GROUP_PAGES = int(os.getenv("EMBED_GROUP_PAGES", "32"))
+EMBED_GROUPS_IN_FLIGHT = int(os.getenv("EMBED_GROUPS_IN_FLIGHT", "2"))
+# Cosmos upserts/deletes kept in flight during ingestion
+COSMOS_WRITE_CONCURRENCY = int(os.getenv("COSMOS_WRITE_CONCURRENCY", "8"))
+
+stats_lock = threading.Lock()
+
+# Tokenizer and service clients, created on first use so importing the module has no side effects
+_encoding = None
+_client = None
+_container = None
+_clients_lock = threading.Lock()
+
+
+def get_encoding():
+    """Tokenizer of the text-embedding-3 models."""
+    global _encoding
+    with _clients_lock:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return _encoding
+
+
+def get_client():
+    """OpenAI client used for embeddings."""
+    global _client
+    with _clients_lock:
+        if _client is None:
+            _client = OpenAI(api_key=openai_api_key)
+        return _client
+
+
+def get_container():
+    """Cosmos DB container the chunks are stored in."""
+    global _container
+    with _clients_lock:
+        if _container is None:
+            cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+            database = cosmos_client.get_database_client(COSMOS_DATABASE_NAME)
+            _container = database.get_container_client(COSMOS_CONTAINER_NAME)
+        return _container
+
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """Get embeddings for a given text using OpenAI's GPT models, reusing cached vectors."""
     text = text.replace("\n", " ")
-    response = client.embeddings.create(
-        input=[text],
-        model=model
-    )
-    return response.data[0].embedding
-
 
-def chunk_text(text, max_tokens=8192):
-    """Split text into chunks that fit within the model's token limit."""
-    words = text.split()
-    chunks = []
-    current_chunk = []
-
-    for word in words:
-        current_chunk.append(word)
-        if len(" ".join(current_chunk)) > max_tokens * 4:  # Approximate token count based on characters
-            chunks.append(" ".join(current_chunk))
-            current_chunk = []
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
+    def create(t):
+        response = get_client().embeddings.create(
+            input=[t],
+            model=model
+        )
+        return response.data[0].embedding
+
+    return get_embedding_cache().get_or_compute(text, model, create).tolist()
+
+
+def count_tokens(text):
+    """Exact token count for the embedding model."""
+    return len(get_encoding().encode_ordinary(text))
+
+
+def iter_chunks(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping chunks of at most `max_tokens` tokens.
+
+    Runs in linear time: every word is tokenized once, and a sliding window of
+    words keeps a running token total instead of re-joining the chunk. Chunks
+    end on word boundaries; consecutive chunks share up to `overlap` tokens.
+
+    Yields:
+        tuple: (chunk_text, char_start, char_end), offsets into `text`.
+    """
+    words = [(match.start(), match.end()) for match in re.finditer(r"\S+", text)]
+    # Word tokens are counted with their leading space, as they occur in running text
+    token_counts = [len(tokens) for tokens in get_encoding().encode_ordinary_batch([" " + text[s:e] for s, e in words])]
+
+    window = deque()
+    window_tokens = 0
+    emitted_end = 0
+    for (start, end), tokens in zip(words, token_counts):
+        if window and window_tokens + tokens > max_tokens:
+            chunk_start, chunk_end = window[0][0], window[-1][1]
+            yield text[chunk_start:chunk_end], chunk_start, chunk_end
+            emitted_end = chunk_end
+            while window and window_tokens > overlap:
+                window_tokens -= window.popleft()[2]
+        window.append((start, end, tokens))
+        window_tokens += tokens
+
+    # The tail is only a new chunk if it holds words past the last emitted one
+    if window and window[-1][1] > emitted_end:
+        chunk_start, chunk_end = window[0][0], window[-1][1]
+        yield text[chunk_start:chunk_end], chunk_start, chunk_end
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Split text into chunks that fit within the given token budget."""
+    return [chunk for chunk, _, _ in iter_chunks(text, max_tokens, overlap)]
+
+
+def batch_by_tokens(texts, max_tokens=MAX_BATCH_TOKENS, max_inputs=MAX_BATCH_INPUTS):
+    """Group text indexes into batches that respect the per-request input and token limits."""
+    batch = []
+    batch_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def embed_batch(texts, model=EMBEDDING_MODEL):
+    """
+    Embed several texts with one request, backing off on rate limits.
+
+    Returns:
+        tuple: (embeddings in input order, tokens billed for the request)
+    """
+    delay = 1.0
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            response = get_client().embeddings.create(input=texts, model=model)
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            return embeddings, response.usage.total_tokens
+        except RETRYABLE_ERRORS as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            # Exponential backoff with jitter so concurrent workers do not retry in lockstep
+            wait = delay + random.uniform(0, delay)
+            print(f"Embedding request failed ({type(e).__name__}), retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            delay = min(delay * 2, 60)
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL, max_workers=EMBED_CONCURRENCY, stats=None, executor=None):
+    """
+    Embed many texts using packed multi-input requests sent concurrently.
+
+    Cached embeddings are reused; only misses are sent to the API, and their
+    results are written back to the cache.
+
+    Args:
+        texts (list): Texts to embed.
+        model (str): OpenAI embedding model.
+        max_workers (int): Maximum number of requests in flight.
+        stats (dict): Optional counters updated with chunks, tokens and requests.
+        executor (ThreadPoolExecutor): Shared request pool; a private pool of
+            `max_workers` threads is used when omitted.
+
+    Returns:
+        list: One embedding (list of floats) per input text.
+    """
+    cache = get_embedding_cache()
+    texts = [text.replace("\n", " ") for text in texts]
+    embeddings = [None] * len(texts)
+
+    # Look up the cache, and send each distinct missing text only once
+    pending = {}
+    for index, text in enumerate(texts):
+        cached = cache.get(text, model)
+        if cached is not None:
+            embeddings[index] = cached.tolist()
+        else:
+            pending.setdefault(cache.make_key(text, model), []).append(index)
+    missing = [indexes[0] for indexes in pending.values()]
+
+    batches = [[missing[i] for i in batch] for batch in batch_by_tokens([texts[i] for i in missing])]
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [(batch, executor.submit(embed_batch, [texts[i] for i in batch], model)) for batch in batches]
+        total_tokens = 0
+        for batch, future in futures:
+            batch_embeddings, tokens = future.result()
+            total_tokens += tokens
+            for index, embedding in zip(batch, batch_embeddings):
+                cache.put(texts[index], model, embedding)
+                for duplicate in pending[cache.make_key(texts[index], model)]:
+                    embeddings[duplicate] = embedding
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    if stats is not None:
+        with stats_lock:
+            stats["chunks"] = stats.get("chunks", 0) + len(texts)
+            stats["cached"] = stats.get("cached", 0) + len(texts) - sum(len(v) for v in pending.values())
+            stats["tokens"] = stats.get("tokens", 0) + total_tokens
+            stats["requests"] = stats.get("requests", 0) + len(batches)
+    return embeddings
+
+
+def report_throughput(stats, elapsed):
+    """Print chunks/sec and tokens/sec for an embedding run."""
+    elapsed = max(elapsed, 1e-9)
+    print(
+        f"Embedded {stats.get('chunks', 0)} chunks ({stats.get('cached', 0)} cached) "
+        f"with {stats.get('requests', 0)} requests and {stats.get('tokens', 0)} tokens in {elapsed:.1f}s: "
+        f"{stats.get('chunks', 0) / elapsed:.1f} chunks/sec, {stats.get('tokens', 0) / elapsed:.0f} tokens/sec"
+    )
 
 
-def get_embedding_for_text_chunks(text, model="text-embedding-3-large"):
+def get_embedding_for_text_chunks(text, model=EMBEDDING_MODEL):
     """Get embeddings for text by processing it in chunks."""
-    chunks = chunk_text(text)
-    embeddings = []
-
-    for chunk in chunks:
-        embedding = get_embedding(chunk, model=model)
-        embeddings.append(embedding)
+    embeddings = embed_texts(chunk_text(text, max_tokens=MAX_INPUT_TOKENS, overlap=0), model=model)
 
     combined_embedding = [sum(x) / len(x) for x in zip(*embeddings)]
     return combined_embedding
@@ -71,146 +270,262 @@ def calculate_embedding_cost(num_tokens, model="text-embedding-3-large"):
     return (num_tokens / 1000) * cost_per_1000_tokens
 
 
-def process_pdf(pdf_path):
-    """Process a PDF, extracting text, and return embedded data."""
+def extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end); runs in a worker process with its own reader."""
     reader = PdfReader(pdf_path)
-    pages = reader.pages
-
-    total_tokens = 0
-    data = []
-
-    for i, page in enumerate(pages):
-        page_text = page.extract_text() or ""
-        text_chunks = chunk_text(page_text)
-        text_tokens = sum(len(chunk) for chunk in text_chunks)
-        total_tokens += text_tokens
-
-        chunk_embeddings = []
-        for chunk in text_chunks:
-            chunk_embedding = get_embedding(chunk)
-            chunk_embeddings.append(chunk_embedding)
-
-        data.append({
-            "page_number": i + 1,
-            "text": page_text,
-            "text_embedding": chunk_embeddings
-        })
-
-    # Calculate cost
-    total_cost = calculate_embedding_cost(total_tokens)
-    print(f"The estimated cost for embedding is: ${total_cost:.4f}")
-
-    return data
-
-
-def store_in_cosmos(data):
-    """Store processed data into Azure Cosmos DB."""
-    for page in data:
-        page_number = page["page_number"]
-        text_chunks = page.get("text_embedding", [])
-
-        for chunk_index, chunk_embedding in enumerate(text_chunks):
-            # Create a unique 'id' for each chunk
-            chunk_id = f"page-{page_number}-chunk-{chunk_index}"
-
-            # Prepare the item with a unique id
-            item = {
-                "id": chunk_id,
-                "page_number": page_number,
-                "chunk_index": chunk_index,
-                "text_embedding": chunk_embedding,
-                "text": page["text"]  # Optionally, include the text if needed
-            }
-
-            container.upsert_item(body=item)
-
-
-def main():
-    # Process the PDF
-    print("Processing PDF...")
-    embedded_data = process_pdf(PDF_PATH)
-
-    if embedded_data:
-        # Store data in Cosmos DB
-        print("Storing data in Cosmos DB...")
-        store_in_cosmos(embedded_data)
-        print("Process completed successfully!")
-
-
-if __name__ == "__main__":
-    main()
-
-
-def calculate_embedding_cost(num_tokens, model="text-embedding-3-large"):
-    """Calculate the cost of embeddings based on token count."""
-    cost_per_1000_tokens = 0.0001  # Cost for text-embedding-3-large
-    return (num_tokens / 1000) * cost_per_1000_tokens
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def iter_pages(pdf_path, max_workers=EXTRACT_WORKERS, pages_per_shard=EXTRACT_PAGES_PER_SHARD):
+    """
+    Extract page text on a process pool and yield it in page order.
+
+    Page ranges are sharded across workers, and only 2 * max_workers shards are
+    submitted ahead of the consumer, so memory does not grow with page count.
+
+    Yields:
+        tuple: (page_number, page_text), page numbers starting at 1.
+    """
+    num_pages = len(PdfReader(pdf_path).pages)
+    shards = ((start, min(start + pages_per_shard, num_pages)) for start in range(0, num_pages, pages_per_shard))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque(
+            (start, executor.submit(extract_page_range, pdf_path, start, end))
+            for start, end in islice(shards, max_workers * 2)
+        )
+        while in_flight:
+            start, future = in_flight.popleft()
+            texts = future.result()
+            for next_start, next_end in islice(shards, 1):
+                in_flight.append((next_start, executor.submit(extract_page_range, pdf_path, next_start, next_end)))
+            for offset, page_text in enumerate(texts):
+                yield start + offset + 1, page_text
+
+
+def content_hash(text, model=EMBEDDING_MODEL):
+    """Hash of a chunk's text and embedding model; a changed hash means the chunk must be re-embedded."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def fetch_existing_hashes():
+    """Map every stored chunk id to its content hash (None for items written before hashing)."""
+    items = get_container().query_items(
+        query="SELECT c.id, c.content_hash FROM c",
+        enable_cross_partition_query=True,
+    )
+    return {item["id"]: item.get("content_hash") for item in items}
+
+
+def partition_key_path():
+    """Property path of the container's partition key, e.g. ["id"] for /id."""
+    return get_container().read()["partitionKey"]["paths"][0].strip("/").split("/")
+
+
+def delete_chunk(chunk_id, key_path, response_hook=None):
+    """
+    Delete a stored chunk.
+
+    The partition key value is read from the stored item, unless the container
+    is partitioned on /id.
+
+    Returns:
+        bool: False when the chunk no longer exists.
+    """
+    if key_path == ["id"]:
+        partition_key = chunk_id
+    else:
+        items = list(get_container().query_items(
+            query="SELECT * FROM c WHERE c.id = @id",
+            parameters=[{"name": "@id", "value": chunk_id}],
+            enable_cross_partition_query=True,
+        ))
+        if not items:
+            print(f"Chunk {chunk_id} was already deleted")
+            return False
+        partition_key = items[0]
+        for key in key_path:
+            partition_key = partition_key.get(key) if isinstance(partition_key, dict) else None
+        if partition_key is None:
+            partition_key = NonePartitionKeyValue
+    try:
+        get_container().delete_item(item=chunk_id, partition_key=partition_key, response_hook=response_hook)
+    except CosmosResourceNotFoundError:
+        print(f"Chunk {chunk_id} was already deleted")
+        return False
+    return True
+
+
+def iter_embedded_pages(pdf_path, model=EMBEDDING_MODEL, stats=None, existing_hashes=None):
+    """
+    Stream embedded pages of a PDF in page order.
+
+    Pages flow from the extraction pool into the chunker, and chunks are
+    embedded in groups on a thread pool while extraction keeps running.
+    Chunks whose id and content hash match `existing_hashes` are not embedded;
+    groups are closed on page count and total chunk tokens, so unchanged pages
+    stream through as fast as changed ones.
+
+    Yields:
+        dict: page_number and chunks, a list of Cosmos-ready items. Unchanged
+        chunks carry `text_embedding` None.
+    """
+    stats = {} if stats is None else stats
+    existing_hashes = existing_hashes or {}
+    pending = deque()
+
+    def drain(limit):
+        # Groups with nothing to embed are yielded as soon as they reach the front
+        while pending and (len(pending) > limit or pending[0][1] is None):
+            pages, future = pending.popleft()
+            embeddings = iter(future.result() if future is not None else ())
+            for page in pages:
+                for item in page["chunks"]:
+                    if "text_embedding" not in item:
+                        item["text_embedding"] = next(embeddings)
+                yield page
+
+    def submit(group):
+        texts = [item["text"] for page in group for item in page["chunks"] if "text_embedding" not in item]
+        future = None
+        if texts:
+            future = group_executor.submit(embed_texts, texts, model, stats=stats, executor=request_executor)
+        pending.append((group, future))
+
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as request_executor, \
+            ThreadPoolExecutor(max_workers=EMBED_GROUPS_IN_FLIGHT) as group_executor:
+        group = []
+        group_tokens = 0
+        for page_number, page_text in iter_pages(pdf_path):
+            items = []
+            for chunk_index, (chunk, char_start, char_end) in enumerate(iter_chunks(page_text)):
+                chunk_id = f"page-{page_number}-chunk-{chunk_index}"
+                chunk_hash = content_hash(chunk, model)
+                chunk_tokens = count_tokens(chunk)
+                unchanged = existing_hashes.get(chunk_id) == chunk_hash
+                item = {
+                    "id": chunk_id,
+                    "page_number": page_number,
+                    "chunk_index": chunk_index,
+                    "text": chunk,
+                    "char_start": char_start,
+                    "char_end": char_end,
+                    "content_hash": chunk_hash,
+                }
+                if unchanged:
+                    item["text_embedding"] = None
+                items.append(item)
+                group_tokens += chunk_tokens
+                if unchanged:
+                    with stats_lock:
+                        stats["skipped"] = stats.get("skipped", 0) + 1
+                        stats["skipped_tokens"] = stats.get("skipped_tokens", 0) + chunk_tokens
+            group.append({"page_number": page_number, "chunks": items})
+            if group_tokens >= EMBED_GROUP_TOKENS or len(group) >= EMBED_GROUP_PAGES:
+                submit(group)
+                group = []
+                group_tokens = 0
+                yield from drain(EMBED_GROUPS_IN_FLIGHT)
+        if group:
+            submit(group)
+        yield from drain(0)
 
 
 def process_pdf(pdf_path):
     """Process a PDF, extracting text, and return embedded data."""
-    reader = PdfReader(pdf_path)
-    pages = reader.pages
-
-    total_tokens = 0
-    data = []
-
-    for i, page in enumerate(pages):
-        page_text = page.extract_text() or ""
-        text_chunks = chunk_text(page_text)
-        text_tokens = sum(len(chunk) for chunk in text_chunks)
-        total_tokens += text_tokens
-
-        chunk_embeddings = []
-        for chunk in text_chunks:
-            chunk_embedding = get_embedding(chunk)
-            chunk_embeddings.append(chunk_embedding)
-
-        data.append({
-            "page_number": i + 1,
-            "text": page_text,
-            "text_embedding": chunk_embeddings
-        })
+    stats = {}
+    start = time.perf_counter()
+    data = list(iter_embedded_pages(pdf_path, stats=stats))
+    report_throughput(stats, time.perf_counter() - start)
 
     # Calculate cost
-    total_cost = calculate_embedding_cost(total_tokens)
-    print(f"The estimated cost for embedding is: ${total_cost:.4f}")
+    total_cost = calculate_embedding_cost(stats.get("tokens", 0))
+    print(f"The cost for embedding is: ${total_cost:.4f}")
 
     return data
 
 
-def store_in_cosmos(data):
-    """Store processed data into Azure Cosmos DB."""
-    for page in data:
-        page_number = page["page_number"]
-        text_chunks = page.get("text_embedding", [])
-
-        for chunk_index, chunk_embedding in enumerate(text_chunks):
-            # Create a unique 'id' for each chunk
-            chunk_id = f"page-{page_number}-chunk-{chunk_index}"
-
-            # Prepare the item with a unique id
-            item = {
-                "id": chunk_id,
-                "page_number": page_number,
-                "chunk_index": chunk_index,
-                "text_embedding": chunk_embedding,
-                "text": page["text"]  # Optionally, include the text if needed
-            }
-
-            container.upsert_item(body=item)
+def store_in_cosmos(data, existing_hashes=None, max_workers=COSMOS_WRITE_CONCURRENCY):
+    """
+    Store processed data into Azure Cosmos DB.
+
+    Changed chunks are upserted with bounded parallelism; unchanged chunks are
+    left alone, and chunk ids in `existing_hashes` that no longer occur in the
+    document are deleted. The vector database's sync() picks the changes up,
+    BM25 index included.
+
+    Args:
+        data (iterable): Pages as produced by iter_embedded_pages().
+        existing_hashes (dict): Stored chunk ids and hashes; no deletions when None.
+        max_workers (int): Maximum number of writes in flight.
+
+    Returns:
+        dict: Counts of written, unchanged and deleted chunks, plus the request
+        units (RU) charged for the writes.
+    """
+    charges = []
+
+    def record_charge(headers, _):
+        charges.append(float(headers.get("x-ms-request-charge", 0)))
+
+    seen = set()
+    summary = {"written": 0, "unchanged": 0, "deleted": 0}
+    in_flight = deque()
+    deletions = []
+    container = get_container()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for page in data:
+            for item in page["chunks"]:
+                seen.add(item["id"])
+                if item["text_embedding"] is None:
+                    summary["unchanged"] += 1
+                    continue
+                in_flight.append(executor.submit(container.upsert_item, body=item, response_hook=record_charge))
+                summary["written"] += 1
+                while len(in_flight) > max_workers * 2:
+                    in_flight.popleft().result()
+
+        stale = (existing_hashes or {}).keys() - seen
+        key_path = partition_key_path() if stale else None
+        for chunk_id in stale:
+            deletions.append(executor.submit(delete_chunk, chunk_id, key_path, response_hook=record_charge))
+        for future in in_flight:
+            future.result()
+        summary["deleted"] = sum(future.result() for future in deletions)
+
+    summary["request_units"] = sum(charges)
+    return summary
+
+
+def report_run_summary(stats, summary):
+    """Print what incremental re-ingestion did and what it avoided."""
+    print(f"Chunks: {summary['written']} written, {summary['unchanged']} unchanged, {summary['deleted']} deleted")
+    print(f"Write cost: {summary['request_units']:.1f} RU")
+    skipped_tokens = stats.get("skipped_tokens", 0)
+    print(f"Embedding avoided: {stats.get('skipped', 0)} chunks, ~{skipped_tokens} tokens, "
+          f"~${calculate_embedding_cost(skipped_tokens):.4f}")
+    if summary["written"] and summary["request_units"]:
+        avg_ru = summary["request_units"] / (summary["written"] + summary["deleted"])
+        print(f"Writes avoided: {summary['unchanged']} upserts, ~{avg_ru * summary['unchanged']:.1f} RU")
+    else:
+        print(f"Writes avoided: {summary['unchanged']} upserts")
 
 
 def main():
-    # Process the PDF
-    print("Processing PDF...")
-    embedded_data = process_pdf(PDF_PATH)
-
-    if embedded_data:
-        # Store data in Cosmos DB
-        print("Storing data in Cosmos DB...")
-        store_in_cosmos(embedded_data)
-        print("Process completed successfully!")
+    # Process the PDF, storing pages as soon as their embeddings are ready
+    print("Processing PDF and storing data in Cosmos DB...")
+    existing_hashes = fetch_existing_hashes()
+    stats = {}
+    start = time.perf_counter()
+    summary = store_in_cosmos(
+        iter_embedded_pages(PDF_PATH, stats=stats, existing_hashes=existing_hashes),
+        existing_hashes=existing_hashes,
+    )
+    report_throughput(stats, time.perf_counter() - start)
+    print(f"The cost for embedding is: ${calculate_embedding_cost(stats.get('tokens', 0)):.4f}")
+    report_run_summary(stats, summary)
+    print("Process completed successfully!")
+    print(f"Embedding cache: {get_embedding_cache().counters()}")
 
 
 if __name__ == "__main__":
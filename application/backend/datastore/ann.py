@@ -0,0 +1,223 @@
+import time
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy.
+
+    Rows are clustered with spherical k-means; each query only scores the rows
+    of the `nprobe` clusters whose centroids are closest to it. Row vectors are
+    expected to be L2-normalized, so the dot product is the cosine similarity.
+    The index stores row ids only; the matrix itself is passed to search().
+    """
+
+    def __init__(self, n_lists=None, nprobe=8, iterations=20, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        # Rows the centroids were learned from; callers retrain once the data outgrows them
+        self.trained_rows = 0
+        # CSR layout: rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_offsets = None
+        self.list_rows = None
+
+    @property
+    def size(self):
+        return 0 if self.list_rows is None else len(self.list_rows)
+
+    @staticmethod
+    def _nearest_centroids(matrix, centroids, batch_size=8192):
+        """Assign every row to its most similar centroid, in bounded batches."""
+        assignments = np.empty(len(matrix), dtype=np.int32)
+        for start in range(0, len(matrix), batch_size):
+            block = matrix[start:start + batch_size]
+            assignments[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def train(self, matrix):
+        """
+        Learn centroids with spherical k-means and build the inverted lists.
+
+        Args:
+            matrix (np.ndarray): L2-normalized float32 row vectors.
+
+        Returns:
+            IVFIndex: self, for chaining.
+        """
+        n_rows = len(matrix)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows) if n_rows else 1
+        rng = np.random.default_rng(self.seed)
+        self.trained_rows = n_rows
+
+        if n_rows == 0:
+            self.centroids = np.zeros((0, matrix.shape[1] if matrix.ndim == 2 else 0), dtype=np.float32)
+            self.assign(matrix)
+            return self
+
+        centroids = np.array(matrix[rng.choice(n_rows, n_lists, replace=False)], dtype=np.float32)
+        for _ in range(self.iterations):
+            assignments = self._nearest_centroids(matrix, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Reseed empty clusters from random rows so every list stays usable
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = matrix[rng.choice(n_rows, len(empty), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            new_centroids = (sums / norms).astype(np.float32)
+            if np.allclose(new_centroids, centroids, atol=1e-6):
+                centroids = new_centroids
+                break
+            centroids = new_centroids
+
+        self.centroids = centroids
+        self.assign(matrix)
+        return self
+
+    def copy(self):
+        """Index sharing the trained centroids, whose lists can be reassigned independently."""
+        index = IVFIndex(n_lists=self.n_lists, nprobe=self.nprobe, iterations=self.iterations, seed=self.seed)
+        index.centroids = self.centroids
+        index.trained_rows = self.trained_rows
+        index.list_offsets = self.list_offsets
+        index.list_rows = self.list_rows
+        return index
+
+    def assign(self, matrix):
+        """
+        Rebuild the inverted lists for `matrix` against the trained centroids.
+
+        This is the cheap path after incremental updates: one matrix product,
+        no re-clustering.
+        """
+        if len(matrix) == 0 or len(self.centroids) == 0:
+            self.list_offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+            self.list_rows = np.zeros(0, dtype=np.int64)
+            return
+        assignments = self._nearest_centroids(matrix, self.centroids)
+        self.list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def search(self, matrix, query, top_k, nprobe=None):
+        """
+        Approximate top-k rows of `matrix` for a normalized query vector.
+
+        Args:
+            matrix (np.ndarray): The matrix the index was built over.
+            query (np.ndarray): L2-normalized query vector.
+            top_k (int): Number of rows to return.
+            nprobe (int): Lists to scan; higher trades latency for recall.
+
+        Returns:
+            np.ndarray: Row indices, most similar first.
+        """
+        if self.size == 0 or top_k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+        candidates = np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe
+        ])
+        if len(candidates) == 0:
+            return candidates
+
+        scores = matrix[candidates] @ query
+        top_k = min(top_k, len(candidates))
+        best = np.argpartition(scores, -top_k)[-top_k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return candidates[best]
+
+    def save(self, file):
+        """Persist the trained index to a path or open binary file (`.npz`)."""
+        np.savez(
+            file,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+            params=np.array([self.nprobe, self.iterations, self.seed, self.trained_rows], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()."""
+        with np.load(path) as data:
+            params = [int(v) for v in data["params"]]
+            nprobe, iterations, seed = params[:3]
+            index = cls(n_lists=len(data["centroids"]), nprobe=nprobe, iterations=iterations, seed=seed)
+            index.centroids = data["centroids"]
+            index.list_offsets = data["list_offsets"]
+            index.list_rows = data["list_rows"]
+            # Files written before trained_rows was stored: assume the lists' size
+            index.trained_rows = params[3] if len(params) > 3 else len(index.list_rows)
+        return index
+
+
+def exact_top_k(matrix, query, top_k):
+    """Brute-force top-k rows for a normalized query, most similar first."""
+    scores = matrix @ query
+    top_k = min(top_k, len(scores))
+    best = np.argpartition(scores, -top_k)[-top_k:]
+    return best[np.argsort(scores[best])[::-1]]
+
+
+def evaluate_recall(index, matrix, queries=None, top_k=10, nprobe_values=(1, 2, 4, 8, 16, 32), sample_size=200,
+                    seed=0):
+    """
+    Measure recall@k and latency of an IVF index against exact search.
+
+    Args:
+        index (IVFIndex): Trained index over `matrix`.
+        matrix (np.ndarray): L2-normalized row vectors.
+        queries (np.ndarray): Normalized query vectors; defaults to a random
+            sample of rows, which approximates in-distribution questions.
+        top_k (int): k for recall@k.
+        nprobe_values (iterable): Settings to evaluate.
+        sample_size (int): Number of rows sampled when `queries` is None.
+        seed (int): Sampling seed.
+
+    Returns:
+        list: One dict per nprobe with recall, mean ANN latency, mean exact
+        latency (both in ms) and the average number of rows scored.
+    """
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(matrix), min(sample_size, len(matrix)), replace=False)
+        queries = np.asarray(matrix[sample], dtype=np.float32)
+
+    start = time.perf_counter()
+    truth = [set(exact_top_k(matrix, q, top_k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+    list_sizes = np.diff(index.list_offsets)
+    report = []
+    for nprobe in nprobe_values:
+        hits = 0
+        scanned = 0
+        start = time.perf_counter()
+        for q, expected in zip(queries, truth):
+            found = index.search(matrix, q, top_k, nprobe=nprobe)
+            hits += len(expected.intersection(found.tolist()))
+        ann_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        for q in queries:
+            probe = np.argsort(index.centroids @ q)[::-1][:nprobe]
+            scanned += int(list_sizes[probe].sum())
+        report.append({
+            "nprobe": nprobe,
+            "recall": hits / max(sum(len(t) for t in truth), 1),
+            "ann_latency_ms": ann_ms,
+            "exact_latency_ms": exact_ms,
+            "avg_rows_scanned": scanned / max(len(queries), 1),
+        })
+    return report
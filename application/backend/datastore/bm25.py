@@ -0,0 +1,138 @@
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+
+# Keeps identifiers such as "ps_checkout", "1.7.8" or "order-state" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring.
+
+    Documents can be added, replaced and removed one at a time, so the index is
+    maintained as chunks are ingested or synced rather than rebuilt. Only the
+    postings of the query terms are visited at search time.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings = {}
+        # doc_id -> {term: term frequency}, needed to remove a document
+        self.documents = {}
+        self.lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, text):
+        """Index a document, replacing any previous version with the same id."""
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.documents[doc_id] = dict(terms)
+        self.lengths[doc_id] = sum(terms.values())
+        self.total_length += self.lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def copy(self):
+        """Independent copy that can be updated while this index keeps serving searches."""
+        index = BM25Index(k1=self.k1, b=self.b)
+        index.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        # Term dicts are replaced, never modified, by add()
+        index.documents = dict(self.documents)
+        index.lengths = dict(self.lengths)
+        index.total_length = self.total_length
+        return index
+
+    def remove(self, doc_id):
+        terms = self.documents.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query, top_k=10):
+        """
+        Rank documents for a query.
+
+        Returns:
+            list: (doc_id, score) pairs, best first.
+        """
+        n_docs = len(self.documents)
+        if not n_docs or top_k <= 0:
+            return []
+        avg_length = self.total_length / n_docs
+
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path):
+        """Write the index to `path` atomically."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix="bm25-", suffix=".json", dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "documents": self.documents}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save(); returns an empty index if there is none."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, terms in data["documents"].items():
+            index.documents[doc_id] = terms
+            index.lengths[doc_id] = sum(terms.values())
+            index.total_length += index.lengths[doc_id]
+            for term, tf in terms.items():
+                index.postings.setdefault(term, {})[doc_id] = tf
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings of ids with reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of ids, each ordered best first.
+        k (int): Damping constant; 60 is the usual choice.
+
+    Returns:
+        list: Ids ordered by fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
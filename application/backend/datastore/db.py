@@ -1,9 +1,20 @@
+import asyncio
+import glob
+import json
 import os
+import re
+import tempfile
+import threading
 
 import numpy as np
 from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from application.backend.datastore.ann import IVFIndex
+from application.backend.datastore.bm25 import BM25Index, reciprocal_rank_fusion
+from application.backend.datastore.embedding_cache import get_embedding_cache
 
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -12,18 +23,432 @@ COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DATABASE_NAME = os.getenv("COSMOS_DATABASE_NAME")
 COSMOS_CONTAINER_NAME = os.getenv("COSMOS_CONTAINER_NAME")
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshot"))
+SNAPSHOT_METADATA = "metadata.json"
+# Candidates taken from each ranking before reciprocal rank fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+# "exact" scores every row; "ivf" scans only the nprobe closest k-means clusters
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "exact")
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0")) or None
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+# Retrain the IVF centroids once the index holds this many times the rows they were learned from (0: never)
+VECTOR_IVF_RETRAIN_GROWTH = float(os.getenv("VECTOR_IVF_RETRAIN_GROWTH", "2"))
+
+# Cosmos system properties that are not worth keeping in the resident index
+COSMOS_SYSTEM_KEYS = {"_rid", "_self", "_etag", "_attachments", "_ts", "_lsn"}
+
+
+class LocalContainer:
+    """
+    In-process stand-in for a Cosmos DB container.
+
+    Implements the subset of the container API used by ChatbotVectorDatabase and
+    the dataloader, and stamps items with a `_ts` like Cosmos does, so snapshot
+    sync can be exercised without a Cosmos account.
+    """
+
+    def __init__(self, items=None, partition_key_path="/id"):
+        self.items = {}
+        self.clock = 0
+        self.partition_key_path = partition_key_path
+        for item in items or []:
+            self.upsert_item(item)
+
+    def upsert_item(self, body, **kwargs):
+        self.clock += 1
+        item = dict(body, _ts=self.clock)
+        self.items[item["id"]] = item
+        return item
+
+    def read(self, **kwargs):
+        return {"id": "local", "partitionKey": {"paths": [self.partition_key_path], "kind": "Hash"}}
+
+    def delete_item(self, item, partition_key=None, **kwargs):
+        item_id = item["id"] if isinstance(item, dict) else item
+        if self.items.pop(item_id, None) is None:
+            raise CosmosResourceNotFoundError(message=f"Entity with the specified id does not exist: {item_id}")
+
+    def read_all_items(self, **kwargs):
+        return iter(list(self.items.values()))
+
+    def query_items(self, query, parameters=None, **kwargs):
+        """Supports the `_ts >= @ts` change query, `id = @id` lookups and `SELECT c.a, c.b FROM c` projections."""
+        params = {p["name"]: p["value"] for p in parameters or []}
+        items = list(self.items.values())
+        if "@ts" in params:
+            items = [item for item in items if item["_ts"] >= params["@ts"]]
+        if "@id" in params:
+            items = [item for item in items if item["id"] == params["@id"]]
+        fields = re.findall(r"c\.(\w+)", query.split(" FROM ")[0])
+        if fields:
+            items = [{field: item[field] for field in fields if field in item} for item in items]
+        return iter(items)
+
+
+class ResidentIndex:
+    """
+    One version of the resident search index.
+
+    The matrix (one L2-normalized float32 row per document), the row-aligned
+    document metadata, the BM25 index and the optional IVF lists always
+    describe the same documents. A version is never modified once published:
+    writers build the next one off to the side and swap it in with a single
+    assignment, and readers take one reference for a whole search.
+    """
+
+    __slots__ = ("matrix", "documents", "positions", "bm25", "ann_index", "high_water_mark")
+
+    def __init__(self, matrix, documents, bm25, ann_index=None, high_water_mark=0, positions=None):
+        self.matrix = matrix
+        self.documents = documents
+        self.positions = positions if positions is not None else {doc["id"]: row for row, doc in enumerate(documents)}
+        self.bm25 = bm25
+        self.ann_index = ann_index
+        # Highest Cosmos `_ts` reflected in the index, used for incremental sync
+        self.high_water_mark = high_water_mark
+
+    def replace(self, **changes):
+        """A new version with some fields replaced; `documents` must not change."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return ResidentIndex(**fields)
+
 
 class ChatbotVectorDatabase:
     PDF_PATH = "User_manual.pdf"
 
-    def __init__(self):
-        # Initialize the Cosmos DB client
-        self.cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-        self.database = self.cosmos_client.get_database_client(COSMOS_DATABASE_NAME)
-        self.container = self.database.get_container_client(COSMOS_CONTAINER_NAME)
+    def __init__(self, container=None, openai_client=None, snapshot_dir=SNAPSHOT_DIR, index_mode=VECTOR_INDEX_MODE,
+                 nprobe=VECTOR_IVF_NPROBE, embedding_cache=None, async_openai_client=None):
+        if container is None:
+            # Initialize the Cosmos DB client
+            self.cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+            self.database = self.cosmos_client.get_database_client(COSMOS_DATABASE_NAME)
+            container = self.database.get_container_client(COSMOS_CONTAINER_NAME)
+        self.container = container
         # Initialize OpenAI client
-        self.openai_client = OpenAI(
+        self.openai_client = openai_client or OpenAI(
             api_key=openai_api_key)
+        # Used by asearch(); created on first use
+        self.async_openai_client = async_openai_client
+        self.embedding_cache = embedding_cache or get_embedding_cache()
+        self.snapshot_dir = snapshot_dir
+        # Current ResidentIndex, None until first loaded
+        self.resident = None
+        # "ivf" keeps an approximate IVF index next to the matrix
+        self.index_mode = index_mode
+        self.nprobe = nprobe
+        # Serializes writers (first load, sync, rebuilds); searches never take it
+        self.index_lock = threading.RLock()
+
+    @property
+    def embedding_matrix(self):
+        return None if self.resident is None else self.resident.matrix
+
+    @property
+    def documents(self):
+        return [] if self.resident is None else self.resident.documents
+
+    @property
+    def positions(self):
+        return {} if self.resident is None else self.resident.positions
+
+    @property
+    def bm25(self):
+        return BM25Index() if self.resident is None else self.resident.bm25
+
+    @property
+    def ann_index(self):
+        return None if self.resident is None else self.resident.ann_index
+
+    @property
+    def high_water_mark(self):
+        return 0 if self.resident is None else self.resident.high_water_mark
+
+    def ensure_index(self):
+        """
+        Make sure the resident index is populated.
+
+        Prefers the on-disk snapshot (memory-mapped, then brought up to date with
+        sync()); falls back to a full Cosmos scan and writes a fresh snapshot.
+        """
+        if self.resident is not None:
+            return
+        with self.index_lock:
+            if self.resident is not None:
+                return
+            if self.snapshot_dir and self.load_snapshot():
+                self.sync()
+                return
+            self.refresh_index()
+            if self.snapshot_dir:
+                self.save_snapshot()
+
+    def refresh_index(self):
+        """
+        Rebuild the in-memory search index from a full Cosmos DB scan.
+
+        Embeddings are stacked into one contiguous float32 matrix and normalized
+        once, so a query only needs a single matrix-vector product. Document
+        metadata (everything except the embedding) is kept alongside, row-aligned.
+
+        Returns:
+            int: Number of indexed documents.
+        """
+        with self.index_lock:
+            documents = []
+            embeddings = []
+            high_water_mark = 0
+            for doc in self.container.read_all_items():
+                high_water_mark = max(high_water_mark, doc.get("_ts", 0))
+                embedding = doc.get("text_embedding")
+                if not embedding:
+                    continue
+                embeddings.append(embedding)
+                documents.append(self.document_metadata(doc))
+
+            if embeddings:
+                matrix = self.normalize_rows(np.asarray(embeddings, dtype=np.float32))
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            ann_index = self.train_ann_index(matrix) if self.index_mode == "ivf" else None
+            self.resident = ResidentIndex(matrix, documents, self.build_bm25(documents), ann_index, high_water_mark)
+            return len(documents)
+
+    @staticmethod
+    def build_bm25(documents):
+        """Lexical index over the text of `documents`."""
+        bm25 = BM25Index()
+        for doc in documents:
+            bm25.add(doc["id"], doc.get("text", ""))
+        return bm25
+
+    def train_ann_index(self, matrix, n_lists=VECTOR_IVF_NLIST):
+        """A newly trained IVF index over `matrix`."""
+        return IVFIndex(n_lists=n_lists, nprobe=self.nprobe).train(matrix)
+
+    def build_ann_index(self, n_lists=VECTOR_IVF_NLIST):
+        """
+        (Re)train the IVF index over the current matrix.
+
+        sync() retrains on its own only when the index has outgrown its
+        centroids (see ann_needs_training()); call this to re-cluster sooner.
+        """
+        with self.index_lock:
+            self.ensure_index()
+            ann_index = self.train_ann_index(self.resident.matrix, n_lists)
+            self.resident = self.resident.replace(ann_index=ann_index)
+            return ann_index
+
+    @staticmethod
+    def ann_needs_training(ann_index, n_rows):
+        """
+        Whether IVF centroids no longer fit `n_rows` rows: there are none (the
+        index was trained on an empty container) or the rows have grown past
+        VECTOR_IVF_RETRAIN_GROWTH times the training set.
+        """
+        if len(ann_index.centroids) == 0:
+            return n_rows > 0
+        return VECTOR_IVF_RETRAIN_GROWTH > 0 and n_rows > ann_index.trained_rows * VECTOR_IVF_RETRAIN_GROWTH
+
+    def updated_ann_index(self, ann_index, matrix):
+        """
+        IVF index for a changed matrix: the trained centroids with rows
+        reassigned, or a retrained index when the centroids no longer fit.
+        `ann_index` itself is left untouched.
+        """
+        if self.ann_needs_training(ann_index, len(matrix)):
+            return self.train_ann_index(matrix)
+        updated = ann_index.copy()
+        updated.assign(matrix)
+        return updated
+
+    @staticmethod
+    def document_metadata(doc):
+        """Strip the embedding and Cosmos system properties from a document."""
+        return {k: v for k, v in doc.items() if k != "text_embedding" and k not in COSMOS_SYSTEM_KEYS}
+
+    def save_snapshot(self):
+        """
+        Persist the resident index to `snapshot_dir`.
+
+        The matrix goes to a uniquely named `.npy` file and the metadata file,
+        which names that matrix, is swapped in last with os.replace(). Readers
+        therefore always see a consistent pair, even while another worker writes.
+        """
+        with self.index_lock:
+            index = self.resident
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            fd, matrix_path = tempfile.mkstemp(prefix="embeddings-", suffix=".npy", dir=self.snapshot_dir)
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(index.matrix, dtype=np.float32))
+
+            metadata = {
+                "matrix": os.path.basename(matrix_path),
+                "high_water_mark": index.high_water_mark,
+                "documents": index.documents,
+            }
+            if index.ann_index is not None:
+                fd, ann_path = tempfile.mkstemp(prefix="ivf-", suffix=".npz", dir=self.snapshot_dir)
+                with os.fdopen(fd, "wb") as f:
+                    index.ann_index.save(f)
+                metadata["ann"] = os.path.basename(ann_path)
+            # The lexical index is versioned with the matrix, so a reader never pairs mismatched files
+            fd, bm25_path = tempfile.mkstemp(prefix="lexical-", suffix=".json", dir=self.snapshot_dir)
+            os.close(fd)
+            index.bm25.save(bm25_path)
+            metadata["bm25"] = os.path.basename(bm25_path)
+            fd, metadata_path = tempfile.mkstemp(prefix="metadata-", suffix=".json", dir=self.snapshot_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(metadata_path, os.path.join(self.snapshot_dir, SNAPSHOT_METADATA))
+
+            # Older matrices stay valid for processes that still map them (POSIX unlink)
+            current = {os.path.join(self.snapshot_dir, metadata[key]) for key in ("matrix", "ann", "bm25")
+                       if key in metadata}
+            stale = glob.glob(os.path.join(self.snapshot_dir, "embeddings-*.npy"))
+            stale += glob.glob(os.path.join(self.snapshot_dir, "ivf-*.npz"))
+            stale += glob.glob(os.path.join(self.snapshot_dir, "lexical-*.json"))
+            for path in stale:
+                if path not in current:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def load_snapshot(self):
+        """
+        Load the on-disk snapshot, memory-mapping the embedding matrix.
+
+        The matrix is mapped read-only, so workers share the page cache; sync()
+        never writes to it but builds changed matrices as new arrays.
+
+        Returns:
+            bool: True if a snapshot was found and loaded.
+        """
+        with self.index_lock:
+            metadata_path = os.path.join(self.snapshot_dir, SNAPSHOT_METADATA)
+            try:
+                with open(metadata_path, encoding="utf-8") as f:
+                    metadata = json.load(f)
+                matrix = np.load(os.path.join(self.snapshot_dir, metadata["matrix"]), mmap_mode="r")
+            except (OSError, ValueError, KeyError):
+                return False
+
+            documents = metadata["documents"]
+            bm25 = BM25Index.load(os.path.join(self.snapshot_dir, metadata.get("bm25", "")))
+            # Snapshots written before the lexical index was versioned get it rebuilt
+            if bm25.documents.keys() != {doc["id"] for doc in documents}:
+                bm25 = self.build_bm25(documents)
+            ann_index = None
+            if self.index_mode == "ivf":
+                try:
+                    ann_index = IVFIndex.load(os.path.join(self.snapshot_dir, metadata["ann"]))
+                    ann_index.nprobe = self.nprobe
+                except (OSError, ValueError, KeyError):
+                    ann_index = self.train_ann_index(matrix)
+                if ann_index.size != len(documents) or self.ann_needs_training(ann_index, len(documents)):
+                    ann_index = self.updated_ann_index(ann_index, matrix)
+            self.resident = ResidentIndex(matrix, documents, bm25, ann_index, metadata["high_water_mark"])
+            return True
+
+    def sync(self, persist=True):
+        """
+        Apply Cosmos changes made since the index's high-water mark.
+
+        Only items with `_ts` at or after the mark are downloaded. Updated rows are
+        replaced, new items are appended, and items that no longer exist in the
+        container (found through an id-only listing) are dropped. The changes go
+        into a new matrix, document list, BM25 index and IVF lists, published
+        together once complete; searches running meanwhile keep the old version.
+
+        Args:
+            persist (bool): Rewrite the snapshot if anything changed.
+
+        Returns:
+            dict: Counts of updated, added and removed documents.
+        """
+        if self.resident is None:
+            self.ensure_index()
+            return {"updated": 0, "added": 0, "removed": 0}
+
+        with self.index_lock:
+            index = self.resident
+            # `>=` because items written in the same second as the mark may be missing
+            changed = self.container.query_items(
+                query="SELECT * FROM c WHERE c._ts >= @ts",
+                parameters=[{"name": "@ts", "value": index.high_water_mark}],
+                enable_cross_partition_query=True,
+            )
+
+            updates = {}
+            new_rows = []
+            new_documents = []
+            high_water_mark = index.high_water_mark
+            for doc in changed:
+                high_water_mark = max(high_water_mark, doc.get("_ts", 0))
+                embedding = doc.get("text_embedding")
+                if not embedding:
+                    continue
+                vector = self.normalize_rows(np.asarray([embedding], dtype=np.float32))[0]
+                metadata = self.document_metadata(doc)
+                row = index.positions.get(doc["id"])
+                if row is None:
+                    new_rows.append(vector)
+                    new_documents.append(metadata)
+                elif index.documents[row] != metadata or not np.array_equal(index.matrix[row], vector):
+                    updates[row] = (vector, metadata)
+
+            live_ids = {item["id"] for item in self.container.query_items(
+                query="SELECT c.id FROM c",
+                enable_cross_partition_query=True,
+            )}
+            keep = np.array([doc["id"] in live_ids for doc in index.documents], dtype=bool)
+            removed = int(len(keep) - keep.sum())
+
+            stats = {"updated": len(updates), "added": len(new_rows), "removed": removed}
+            if not any(stats.values()):
+                self.resident = index.replace(high_water_mark=high_water_mark)
+                return stats
+
+            matrix = index.matrix
+            documents = list(index.documents)
+            bm25 = index.bm25.copy()
+            if updates:
+                # Private copy: the published (possibly memory-mapped) matrix is never written
+                matrix = np.array(matrix)
+                for row, (vector, metadata) in updates.items():
+                    matrix[row] = vector
+                    documents[row] = metadata
+                    bm25.add(metadata["id"], metadata.get("text", ""))
+            if removed:
+                for doc, alive in zip(documents, keep):
+                    if not alive:
+                        bm25.remove(doc["id"])
+                matrix = matrix[keep]
+                documents = [doc for doc, alive in zip(documents, keep) if alive]
+            if new_rows:
+                for metadata in new_documents:
+                    bm25.add(metadata["id"], metadata.get("text", ""))
+                new_matrix = np.asarray(new_rows, dtype=np.float32)
+                matrix = np.concatenate([matrix, new_matrix]) if len(documents) else new_matrix
+                documents.extend(new_documents)
+
+            ann_index = None if index.ann_index is None else self.updated_ann_index(index.ann_index, matrix)
+            self.resident = ResidentIndex(matrix, documents, bm25, ann_index, high_water_mark)
+
+            if persist and self.snapshot_dir:
+                self.save_snapshot()
+                self.load_snapshot()
+            return stats
+
+    @staticmethod
+    def normalize_rows(matrix):
+        """L2-normalize each row of a matrix, leaving all-zero rows untouched."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
 
     @staticmethod
     def cosine_similarity(vec1, vec2):
@@ -32,44 +457,116 @@ class ChatbotVectorDatabase:
 
     def get_embedding(self, text, model="text-embedding-3-large"):
         """
-        Generate an embedding for the given text.
+        Generate an embedding for the given text, served from the embedding cache when possible.
         Args:
             text (str): Input text for which to generate the embedding.
             model (str): OpenAI model to use.
         Returns:
-            list: The embedding vector.
+            np.ndarray: The float32 embedding vector.
+        """
+        text = text.replace("\n", " ")
+        return self.embedding_cache.get_or_compute(
+            text, model,
+            lambda t: self.openai_client.embeddings.create(input=[t], model=model).data[0].embedding,
+        )
+
+    async def aget_embedding(self, text, model="text-embedding-3-large"):
+        """
+        Async get_embedding(). The cache's SQLite tier is read and written in a
+        worker thread; misses are embedded with the async OpenAI client.
         """
         text = text.replace("\n", " ")
-        return self.openai_client.embeddings.create(input=[text], model=model).data[0].embedding
+        vector = await asyncio.to_thread(self.embedding_cache.get, text, model)
+        if vector is None:
+            if self.async_openai_client is None:
+                self.async_openai_client = AsyncOpenAI(api_key=openai_api_key)
+            response = await self.async_openai_client.embeddings.create(input=[text], model=model)
+            vector = await asyncio.to_thread(self.embedding_cache.put, text, model, response.data[0].embedding)
+        return vector
 
-    def search(self, query, model="text-embedding-3-large", top_k=3):
+    def search(self, query, model="text-embedding-3-large", top_k=3, nprobe=None, mode="vector"):
         """
-        Search Cosmos DB based on a user's query using semantic similarity.
+        Search the resident index based on a user's query.
+
+        The index is loaded on the first call (from the snapshot when present);
+        call sync() or refresh_index() to pick up documents ingested afterwards.
 
         Args:
             query (str): User's search query.
             model (str): OpenAI model to generate query embedding.
             top_k (int): Number of top results to return.
+            nprobe (int): IVF lists to scan when index_mode is "ivf".
+            mode (str): "vector" for semantic similarity, "lexical" for BM25, or
+                "hybrid" to fuse both rankings with reciprocal rank fusion.
 
         Returns:
-            list: Top matching documents from Cosmos DB.
+            list: Top matching documents, without their embeddings.
         """
-        # Get embedding for the user's query
-        query_embedding = self.get_embedding(query, model=model)
+        # Build the resident index on first use; later refreshes are explicit
+        self.ensure_index()
+        if not self.documents or top_k <= 0:
+            return []
+        query_embedding = None if mode == "lexical" else self.get_embedding(query, model=model)
+        return self.rank(query, query_embedding, top_k, nprobe, mode)
 
-        # Fetch all documents from Cosmos DB
-        documents = list(self.container.read_all_items())
+    async def asearch(self, query, model="text-embedding-3-large", top_k=3, nprobe=None, mode="vector"):
+        """
+        Async search(), for callers running on an event loop.
 
-        # Compute similarities
-        results = []
-        for doc in documents:
-            doc_embedding = np.array(doc["text_embedding"])
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
-            results.append({"document": doc, "similarity": similarity})
+        The first (blocking) index load runs in a worker thread and the query
+        embedding is fetched with the async OpenAI client; ranking itself is a
+        few in-memory array operations and runs inline.
+        """
+        if self.embedding_matrix is None:
+            await asyncio.to_thread(self.ensure_index)
+        if not self.documents or top_k <= 0:
+            return []
+        query_embedding = None if mode == "lexical" else await self.aget_embedding(query, model=model)
+        return self.rank(query, query_embedding, top_k, nprobe, mode)
+
+    def rank(self, query, query_embedding, top_k, nprobe=None, mode="vector"):
+        """Top documents for a query whose embedding is already known (None for lexical mode)."""
+        # One version throughout, even if sync() publishes a new one meanwhile
+        index = self.resident
+        if not index.documents or top_k <= 0:
+            return []
+        if mode == "vector":
+            rows = self.vector_ranking(query_embedding, top_k, nprobe, index=index)
+            return [index.documents[i] for i in rows]
+        if mode == "lexical":
+            return [index.documents[index.positions[doc_id]] for doc_id, _ in index.bm25.search(query, top_k)]
+        if mode != "hybrid":
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        depth = max(top_k, HYBRID_CANDIDATES)
+        vector_rows = self.vector_ranking(query_embedding, depth, nprobe, index=index)
+        vector_ids = [index.documents[i]["id"] for i in vector_rows]
+        lexical_ids = [doc_id for doc_id, _ in index.bm25.search(query, depth)]
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids])[:top_k]
+        return [index.documents[index.positions[doc_id]] for doc_id in fused]
+
+    def vector_ranking(self, query_embedding, top_k, nprobe=None, index=None):
+        """
+        Row indices of the top_k documents most similar to a query embedding, best first.
+
+        Rows refer to `index` (a ResidentIndex), by default the current one.
+        """
+        index = index or self.resident
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_embedding)
+        if query_norm:
+            query_embedding = query_embedding / query_norm
+
+        if index.ann_index is not None:
+            return index.ann_index.search(index.matrix, query_embedding, top_k, nprobe=nprobe)
+
+        # Rows are pre-normalized, so the dot product is the cosine similarity
+        similarities = index.matrix @ query_embedding
 
-        # Sort results by similarity and return top_k
-        results = sorted(results, key=lambda x: x["similarity"], reverse=True)
-        return [result["document"] for result in results[:top_k]]
+        # Partial selection of the top_k rows, then order only those
+        top_k = min(top_k, len(similarities))
+        top_indices = np.argpartition(similarities, -top_k)[-top_k:]
+        return top_indices[np.argsort(similarities[top_indices])[::-1]]
 
 
 def chatbot_test():
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "embedding_cache.sqlite"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "200000"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))
+
+# How many disk writes between two pruning passes over the SQLite tier
+PRUNE_EVERY = 500
+# Part of every key; bump when the key normalization changes so old entries are not reused
+KEY_VERSION = 2
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors.
+
+    The first tier is an in-process LRU; the second is a SQLite file shared by
+    every process on the host and surviving restarts. Keys hash the model name
+    with whitespace-normalized text, so questions that differ only in spacing
+    share one entry. Case is kept: embeddings are case-sensitive, and ingestion
+    chunks that differ only in case need their own vectors. Vectors are stored
+    as float32 blobs.
+
+    Returned vectors are shared with the cache and read-only in both tiers;
+    callers that need to modify one must copy it first.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_SIZE,
+                 max_disk_entries=EMBEDDING_CACHE_DISK_SIZE, ttl_seconds=EMBEDDING_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.writes_since_prune = 0
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, text, model):
+        return hashlib.sha256(f"{KEY_VERSION}\0{model}\0{cls.normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at):
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key, vector, created_at):
+        self.memory[key] = (vector, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, text, model):
+        """
+        Look up a cached embedding.
+
+        Returns:
+            np.ndarray: Read-only float32 vector, or None on a miss or expired entry.
+        """
+        key = self.make_key(text, model)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+            self.memory.pop(key, None)
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT embedding, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector, row[1])
+                    self.stats["disk_hits"] += 1
+                    return vector
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, text, model, embedding):
+        """Store an embedding in both tiers and return it as a read-only float32 array."""
+        key = self.make_key(text, model)
+        # Own copy, read-only like the np.frombuffer() vectors of the disk tier
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        created_at = time.time()
+        with self.lock:
+            self._remember(key, vector, created_at)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding, created_at) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), created_at),
+                )
+                self.conn.commit()
+                self.writes_since_prune += 1
+                if self.writes_since_prune >= PRUNE_EVERY:
+                    self._prune_disk()
+        return vector
+
+    def get_or_compute(self, text, model, compute):
+        """
+        Return the cached embedding for `text`, calling `compute(text)` on a miss.
+
+        Args:
+            text (str): Text to embed.
+            model (str): Embedding model name, part of the cache key.
+            compute (callable): Produces the embedding when it is not cached.
+
+        Returns:
+            np.ndarray: float32 embedding vector.
+        """
+        vector = self.get(text, model)
+        if vector is None:
+            vector = self.put(text, model, compute(text))
+        return vector
+
+    def _prune_disk(self):
+        """Drop expired entries, then the oldest ones beyond max_disk_entries."""
+        self.writes_since_prune = 0
+        if self.ttl_seconds > 0:
+            self.conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        self.conn.commit()
+
+    def counters(self):
+        """Hit/miss counters plus the current tier sizes."""
+        with self.lock:
+            counters = dict(self.stats)
+            counters["memory_entries"] = len(self.memory)
+            if self.conn is not None:
+                counters["disk_entries"] = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = (lookups - counters["misses"]) / lookups if lookups else 0.0
+        return counters
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache shared by query-time search and ingestion."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(BASE_DIR, "sessions.sqlite"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+# Seconds between two eviction passes
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "600"))
+
+
+class SessionStore:
+    """
+    Conversation state per session, checkpointed to SQLite.
+
+    Graph state is saved by LangGraph's AsyncSqliteSaver under the session id
+    as thread id, so a request only carries the new message. After each turn
+    only the latest top-level checkpoint of the session is kept (sub-agent and
+    intermediate checkpoints are dropped), and sessions idle for longer than
+    `ttl_seconds` are evicted by a periodic sweep.
+    """
+
+    def __init__(self, saver, ttl_seconds=SESSION_TTL_SECONDS):
+        self.saver = saver
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"turns": 0, "evicted": 0, "pruned_checkpoints": 0}
+
+    @classmethod
+    @asynccontextmanager
+    async def open(cls, path=SESSION_DB_PATH, **kwargs):
+        async with AsyncSqliteSaver.from_conn_string(path) as saver:
+            store = cls(saver, **kwargs)
+            await store.setup()
+            yield store
+
+    async def setup(self):
+        await self.saver.setup()
+        async with self.saver.lock:
+            await self.saver.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            await self.saver.conn.commit()
+
+    @staticmethod
+    def config(session_id):
+        """Graph config that checkpoints into `session_id`."""
+        return {"configurable": {"thread_id": session_id}}
+
+    async def touch(self, session_id):
+        async with self.saver.lock:
+            await self.saver.conn.execute(
+                "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, time.time()),
+            )
+            await self.saver.conn.commit()
+
+    async def prune(self, session_id):
+        """Drop every checkpoint of a session except its latest top-level one."""
+        async with self.saver.lock:
+            conn = self.saver.conn
+            async with conn.execute(
+                "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+                (session_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None or row[0] is None:
+                return
+            latest = row[0]
+            cursor = await conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND (checkpoint_ns != '' OR checkpoint_id != ?)",
+                (session_id, latest),
+            )
+            pruned = cursor.rowcount
+            await conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND (checkpoint_ns != '' OR checkpoint_id != ?)",
+                (session_id, latest),
+            )
+            await conn.commit()
+        self.stats["turns"] += 1
+        self.stats["pruned_checkpoints"] += pruned
+
+    async def evict_expired(self, now=None):
+        """
+        Delete the state of sessions idle for longer than the TTL.
+
+        Returns:
+            int: Number of sessions evicted.
+        """
+        cutoff = (now or time.time()) - self.ttl_seconds
+        async with self.saver.lock:
+            conn = self.saver.conn
+            async with conn.execute("SELECT session_id FROM sessions WHERE last_seen < ?", (cutoff,)) as cursor:
+                expired = [row[0] for row in await cursor.fetchall()]
+            for session_id in expired:
+                await conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (session_id,))
+                await conn.execute("DELETE FROM writes WHERE thread_id = ?", (session_id,))
+                await conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            await conn.commit()
+        self.stats["evicted"] += len(expired)
+        return len(expired)
+
+    async def run_eviction(self, interval=SESSION_SWEEP_SECONDS):
+        """Evict expired sessions every `interval` seconds until cancelled."""
+        while True:
+            try:
+                evicted = await self.evict_expired()
+                if evicted:
+                    print(f"Evicted {evicted} idle session(s)")
+            except Exception as e:
+                print(f"Session eviction failed: {e}")
+            await asyncio.sleep(interval)
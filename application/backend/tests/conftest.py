@@ -0,0 +1,13 @@
+import pytest
+
+from application.backend.chatbot.clients import ClientRegistry, ModelLimiter
+from application.backend.tests.fake_openai import FakeOpenAIServer, FakeOpenAITransport
+
+
+@pytest.fixture
+def fake_openai():
+    """A FakeOpenAIServer and a ClientRegistry whose async clients talk to it; gpt-4o is limited to 3."""
+    server = FakeOpenAIServer(delay=0.05)
+    registry = ClientRegistry(ModelLimiter({"gpt-4o": 3}, default_limit=16),
+                              async_http_transport=FakeOpenAITransport(server, ClientRegistry.limits()))
+    return server, registry
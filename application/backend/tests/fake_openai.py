@@ -0,0 +1,119 @@
+"""Fake OpenAI API for client tests: a network backend under a real httpcore connection pool."""
+import asyncio
+import json
+
+import httpcore
+import httpx
+
+FAKE_OPENAI_URL = "http://fake-openai/v1"
+
+
+class FakeOpenAIStream(httpcore.AsyncNetworkStream):
+    """One fake TCP connection: parses HTTP/1.1 requests and answers them in order."""
+
+    def __init__(self, server):
+        self.server = server
+        self.buffer = b""
+        self.requests = []
+
+    async def write(self, buffer, timeout=None):
+        self.buffer += buffer
+        while b"\r\n\r\n" in self.buffer:
+            head, rest = self.buffer.split(b"\r\n\r\n", 1)
+            lines = head.decode("latin-1").split("\r\n")
+            headers = dict(line.split(": ", 1) for line in lines[1:])
+            length = int(headers.get("Content-Length", headers.get("content-length", "0")))
+            if len(rest) < length:
+                return
+            self.requests.append((lines[0].split(" ")[1], rest[:length]))
+            self.buffer = rest[length:]
+
+    async def read(self, max_bytes, timeout=None):
+        if not self.requests:
+            return b""
+        path, body = self.requests.pop(0)
+        return await self.server.respond(path, body)
+
+    async def aclose(self):
+        pass
+
+    async def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        # https URLs, such as the real API base URL, are served in plain text
+        return self
+
+    def get_extra_info(self, info):
+        return None
+
+
+class FakeOpenAIServer(httpcore.AsyncNetworkBackend):
+    """
+    In-process stand-in for the OpenAI API, used as the network backend of a
+    real httpcore connection pool.
+
+    Answers chat completion (plain or streamed) and embedding requests after
+    `delay` seconds and counts the connections opened, requests served and
+    the peak number of requests in flight per model.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = {}
+        self.peak_in_flight = {}
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.connections += 1
+        return FakeOpenAIStream(self)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def respond(self, path, body):
+        request = json.loads(body)
+        model = request["model"]
+        self.requests += 1
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        self.peak_in_flight[model] = max(self.peak_in_flight.get(model, 0), self.in_flight[model])
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight[model] -= 1
+
+        content_type = "application/json"
+        if path.endswith("/embeddings"):
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            content = json.dumps({"object": "list", "model": model, "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                                  "data": [{"object": "embedding", "index": i, "embedding": [1.0, 0.0, 0.0]}
+                                           for i in range(len(inputs))]})
+        elif request.get("stream"):
+            content_type = "text/event-stream"
+            chunk = {"id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": 0, "model": model}
+            events = [{**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": "ok"},
+                                             "finish_reason": None}]},
+                      {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+            if request.get("stream_options", {}).get("include_usage"):
+                events.append({**chunk, "choices": [],
+                               "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}})
+            content = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        else:
+            content = json.dumps({"id": f"chatcmpl-{self.requests}", "object": "chat.completion", "created": 0,
+                                  "model": model, "choices": [{"index": 0, "finish_reason": "stop",
+                                                               "message": {"role": "assistant", "content": "ok"}}],
+                                  "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}})
+        content = content.encode()
+        return (f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n").encode() + content
+
+
+class FakeOpenAITransport(httpx.AsyncHTTPTransport):
+    """httpx's pooled async transport with its connections going to a FakeOpenAIServer."""
+
+    def __init__(self, server, limits):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=server,
+        )
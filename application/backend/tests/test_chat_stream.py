@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from application.backend.chatbot import clients
+from application.backend.chatbot.clients import ClientRegistry
+from application.backend.datastore import db, embedding_cache
+from application.backend.datastore.db import LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+from application.backend.tests.fake_openai import FakeOpenAIServer, FakeOpenAITransport
+
+QUESTION = "How do I configure shipping carriers for my online store?"
+CONCURRENCY = 8
+
+
+class FakeCosmosClient:
+    """CosmosClient stand-in whose container is an empty LocalContainer."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_database_client(self, name):
+        return self
+
+    def get_container_client(self, name):
+        return LocalContainer()
+
+
+@pytest.fixture(scope="module")
+def chat_app():
+    """The FastAPI app with every model call answered by a FakeOpenAIServer after 0.5 s."""
+    server = FakeOpenAIServer(delay=0.5)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("OPENAI_API_KEY", "test")
+        patch.setattr(clients, "openai_api_key", "test")
+        patch.setattr(clients, "registry", ClientRegistry(
+            async_http_transport=FakeOpenAITransport(server, ClientRegistry.limits())))
+        patch.setattr(db, "CosmosClient", FakeCosmosClient)
+        patch.setattr(embedding_cache, "_default_cache", EmbeddingCache(path=None))
+        from application.backend.api.api import app
+        yield server, app
+
+
+async def run_stream(client):
+    """Consume one /chat_stream response; returns its final event."""
+    payload = {"conversation": [{"sender": "user", "content": QUESTION}]}
+    async with client.stream("POST", "/chat_stream", json=payload) as response:
+        events = [json.loads(line[len("data: "):]) async for line in response.aiter_lines()
+                  if line.startswith("data: ")]
+    return events[-1]
+
+
+def test_concurrent_streams_do_not_serialize(chat_app):
+    server, app = chat_app
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            # Warm-up: opens the product database
+            await run_stream(client)
+
+            start = time.perf_counter()
+            single = await run_stream(client)
+            single_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(run_stream(client) for _ in range(CONCURRENCY)))
+            return single, single_seconds, results, time.perf_counter() - start
+
+    single, single_seconds, results, wall_seconds = asyncio.run(run())
+    assert single["type"] == "final" and single["data"] == "ok"
+    assert all(result["type"] == "final" and result["data"] == "ok" for result in results)
+    # Fully serialized streams would take CONCURRENCY times as long as one
+    assert wall_seconds < 2.5 * single_seconds
+    assert server.peak_in_flight["gpt-4o"] >= CONCURRENCY // 2
+
+
+@pytest.mark.parametrize("payload", [
+    {"session_id": "s1"},
+    {"session_id": "s1", "message": ""},
+    {},
+    {"conversation": [{"sender": "user"}]},
+])
+def test_malformed_requests_are_rejected_before_streaming(chat_app, payload):
+    _, app = chat_app
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/chat_stream", json=payload)
+
+    response = asyncio.run(run())
+    assert response.status_code == 422
+    assert "detail" in response.json()
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import httpx
+from openai import AsyncOpenAI
+
+from application.backend.chatbot.clients import ClientRegistry
+from application.backend.datastore.db import ChatbotVectorDatabase, LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+from application.backend.tests.fake_openai import FAKE_OPENAI_URL
+
+
+def chat_model(registry, model):
+    return registry.chat_model(model, base_url=FAKE_OPENAI_URL, api_key="test")
+
+
+def test_sequential_requests_reuse_one_connection(fake_openai):
+    server, registry = fake_openai
+    llm = chat_model(registry, "gpt-4o")
+
+    async def run():
+        for _ in range(5):
+            assert (await llm.ainvoke("hello")).content == "ok"
+
+    asyncio.run(run())
+    assert server.requests == 5
+    assert server.connections == 1
+    assert registry.stats()["async_pool"]["connections"] == 1
+
+
+def test_model_limiter_caps_concurrent_requests(fake_openai):
+    server, registry = fake_openai
+    limited = chat_model(registry, "gpt-4o")
+    unlimited = chat_model(registry, "gpt-3.5-turbo")
+
+    async def run():
+        await asyncio.gather(*(limited.ainvoke("hello") for _ in range(12)),
+                             *(unlimited.ainvoke("hello") for _ in range(6)))
+
+    asyncio.run(run())
+    models = registry.stats()["models"]
+    assert server.peak_in_flight["gpt-4o"] == 3
+    assert models["gpt-4o"]["peak_in_flight"] == 3
+    assert models["gpt-4o"]["requests"] == 12
+    assert models["gpt-4o"]["in_flight"] == models["gpt-4o"]["waiting"] == 0
+    # Other models are not held back by gpt-4o's limit
+    assert server.peak_in_flight["gpt-3.5-turbo"] == 6
+    # Released connections are reused rather than opened per request
+    assert server.connections <= 9
+
+
+class ThreadRecordingCache(EmbeddingCache):
+    def __init__(self):
+        super().__init__(path=None)
+        self.threads = []
+
+    def get(self, text, model):
+        self.threads.append(threading.current_thread())
+        return super().get(text, model)
+
+    def put(self, text, model, embedding):
+        self.threads.append(threading.current_thread())
+        return super().put(text, model, embedding)
+
+
+def test_aget_embedding_keeps_cache_io_off_the_event_loop(fake_openai):
+    server, registry = fake_openai
+    cache = ThreadRecordingCache()
+    db = ChatbotVectorDatabase(container=LocalContainer(), openai_client=object(), snapshot_dir=None,
+                               embedding_cache=cache)
+
+    async def run():
+        db.async_openai_client = AsyncOpenAI(api_key="test", base_url=FAKE_OPENAI_URL,
+                                             http_client=registry.async_http_client())
+        first = await db.aget_embedding("flash size")
+        second = await db.aget_embedding("flash size")
+        return first, second, threading.current_thread()
+
+    first, second, loop_thread = asyncio.run(run())
+    assert first.tolist() == second.tolist() == [1.0, 0.0, 0.0]
+    assert server.requests == 1
+    assert len(cache.threads) == 3
+    assert loop_thread not in cache.threads
+
+
+def test_stats_of_a_transport_without_a_pool():
+    registry = ClientRegistry(async_http_transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    registry.async_http_client()
+    assert registry.stats()["async_pool"] == {"connections": None, "idle": None, "active": None}
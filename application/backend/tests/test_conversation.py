@@ -0,0 +1,38 @@
+from langchain_core.messages import AIMessage, ChatMessage, HumanMessage
+
+from application.backend.chatbot.conversation import SummaryCache
+
+
+def turn(number):
+    return [
+        ChatMessage(content=f"question {number}", role="user"),
+        HumanMessage(content=f"instructions {number}", name="supervisor_instructions"),
+        AIMessage(content=f"answer {number}", name="product_selection_agent"),
+        AIMessage(content=f"final {number}", name="supervisor"),
+    ]
+
+
+def test_summary_cache_resumes_from_the_longest_cached_turn():
+    cache = SummaryCache()
+    first = turn(1) + turn(2)
+    assert cache.lookup("", first) == (0, "")
+    cache.store("", first, "summary of turns 1-2")
+
+    # The next stateless request compacts the same turns, rebuilt as new message objects, plus one more
+    second = turn(1) + turn(2) + turn(3)
+    assert cache.lookup("", second) == (len(first), "summary of turns 1-2")
+    cache.store("", second, "summary of turns 1-3")
+    assert cache.lookup("", turn(1) + turn(2) + turn(3)) == (len(second), "summary of turns 1-3")
+
+    # Prefixes that do not end at a turn boundary, or another starting summary, do not match
+    assert cache.lookup("", first[:6]) == (0, "")
+    assert cache.lookup("earlier summary", first) == (0, "earlier summary")
+    assert cache.stats == {"hits": 1, "partial_hits": 1, "misses": 3}
+
+
+def test_summary_cache_is_bounded():
+    cache = SummaryCache(max_entries=2)
+    for number in range(3):
+        cache.store("", turn(number), f"summary {number}")
+    assert len(cache.entries) == 2
+    assert cache.lookup("", turn(0)) == (0, "")
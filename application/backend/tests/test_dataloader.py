@@ -0,0 +1,44 @@
+from application.backend.dataloader import dataloader
+
+
+class WordEncoding:
+    """Tokenizer stand-in counting one token per word."""
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+def test_unchanged_pages_stream_before_extraction_finishes(monkeypatch):
+    monkeypatch.setattr(dataloader, "_encoding", WordEncoding())
+    monkeypatch.setattr(dataloader, "EMBED_GROUP_PAGES", 2)
+    pages = [(number, f"page {number} describes the flash controller") for number in range(1, 11)]
+    existing_hashes = {
+        f"page-{number}-chunk-{index}": dataloader.content_hash(chunk)
+        for number, text in pages
+        for index, chunk in enumerate(dataloader.chunk_text(text))
+    }
+    extracted = []
+
+    def iter_pages(pdf_path):
+        for page in pages:
+            extracted.append(page[0])
+            yield page
+
+    def embed_texts(*args, **kwargs):
+        raise AssertionError("unchanged chunks sent for embedding")
+
+    monkeypatch.setattr(dataloader, "iter_pages", iter_pages)
+    monkeypatch.setattr(dataloader, "embed_texts", embed_texts)
+
+    stats = {}
+    stream = dataloader.iter_embedded_pages("manual.pdf", stats=stats, existing_hashes=existing_hashes)
+    first = next(stream)
+    assert first["page_number"] == 1
+    assert first["chunks"][0]["text_embedding"] is None
+    assert len(extracted) < len(pages)
+
+    assert [page["page_number"] for page in stream] == list(range(2, 11))
+    assert stats["skipped"] == len(existing_hashes)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from application.backend.datastore.db import ChatbotVectorDatabase, LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-large"
+
+
+class NoEmbeddings:
+    """OpenAI client stand-in for tests where every embedding must come from the cache."""
+
+    @property
+    def embeddings(self):
+        raise AssertionError("embedding API called on a cache hit")
+
+
+def make_database(cache):
+    container = LocalContainer([
+        {"id": "a", "text": "flash memory", "page_number": 1, "text_embedding": [1.0, 0.0, 0.0]},
+        {"id": "b", "text": "shipping fees", "page_number": 2, "text_embedding": [0.0, 1.0, 0.0]},
+    ])
+    return ChatbotVectorDatabase(container=container, openai_client=NoEmbeddings(), snapshot_dir=None,
+                                 embedding_cache=cache)
+
+
+def test_disk_hit_then_search(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(path).put("Which chip has the most flash?", MODEL, [3.0, 0.5, 0.0])
+
+    # A fresh cache on the same file serves the vector from the SQLite tier
+    cache = EmbeddingCache(path)
+    db = make_database(cache)
+    results = db.search("Which chip has the most flash?", top_k=2)
+
+    assert cache.stats["disk_hits"] == 1
+    assert [doc["id"] for doc in results] == ["a", "b"]
+    # Searching must not have modified the cached vector
+    assert cache.get("Which chip has the most flash?", MODEL).tolist() == [3.0, 0.5, 0.0]
+
+
+def test_cached_vectors_are_read_only(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    embedding = np.array([1.0, 2.0], dtype=np.float32)
+    stored = EmbeddingCache(path).put("text", MODEL, embedding)
+
+    assert embedding.flags.writeable
+    with pytest.raises(ValueError):
+        stored /= 2
+    with pytest.raises(ValueError):
+        EmbeddingCache(path).get("text", MODEL)[0] = 0.0
+
+
+def test_keys_collapse_whitespace_but_keep_case():
+    cache = EmbeddingCache(path=None)
+    cache.put("Flash  size\nof M032", MODEL, [1.0, 0.0])
+
+    assert cache.get("Flash size of M032", MODEL).tolist() == [1.0, 0.0]
+    assert cache.get("flash size of m032", MODEL) is None
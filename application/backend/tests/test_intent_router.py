@@ -0,0 +1,20 @@
+from application.backend.chatbot.intent_router import ECOMMERCE_AGENT, PRODUCT_AGENT, IntentRouter
+
+EXAMPLES = {PRODUCT_AGENT: ["flash size of a chip"], ECOMMERCE_AGENT: ["shipping fees of the shop"]}
+
+
+def test_centroid_embeddings_are_computed_outside_the_lock():
+    calls = []
+
+    def embed(texts):
+        # The router's counters stay available while the embedding request runs
+        assert router.lock.acquire(blocking=False)
+        router.lock.release()
+        calls.append(texts)
+        return [[1.0, 0.0] if "chip" in text else [0.0, 1.0] for text in texts]
+
+    router = IntentRouter(embed=embed, examples=EXAMPLES)
+    assert router.by_centroid("which chip has more flash") == (PRODUCT_AGENT, 1.0)
+    assert router.by_centroid("shipping fees for the shop") == (ECOMMERCE_AGENT, 1.0)
+    # Seed questions are embedded once, each question once
+    assert len(calls) == len(EXAMPLES) + 2
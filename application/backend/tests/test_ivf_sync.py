@@ -0,0 +1,64 @@
+import numpy as np
+
+from application.backend.datastore.db import ChatbotVectorDatabase, LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+
+
+def document(number, dimensions=8):
+    vector = np.random.default_rng(number).standard_normal(dimensions)
+    return {"id": f"doc-{number}", "text": f"chunk {number}", "page_number": number, "text_embedding": vector.tolist()}
+
+
+def make_database(container, snapshot_dir=None):
+    return ChatbotVectorDatabase(container=container, openai_client=object(), snapshot_dir=snapshot_dir,
+                                 index_mode="ivf", embedding_cache=EmbeddingCache(path=None))
+
+
+def nearest(db, number):
+    query = np.asarray(document(number)["text_embedding"], dtype=np.float32)
+    return [db.documents[row]["id"] for row in db.vector_ranking(query, 1, nprobe=1)]
+
+
+def test_sync_trains_an_index_started_on_an_empty_container():
+    container = LocalContainer()
+    db = make_database(container)
+    db.ensure_index()
+    assert len(db.ann_index.centroids) == 0
+
+    for number in range(20):
+        container.upsert_item(document(number))
+    db.sync(persist=False)
+
+    assert len(db.ann_index.centroids) > 0
+    assert db.ann_index.size == 20
+    assert nearest(db, 7) == ["doc-7"]
+
+
+def test_load_snapshot_trains_an_index_saved_empty(tmp_path):
+    container = LocalContainer()
+    make_database(container, str(tmp_path)).ensure_index()
+
+    for number in range(20):
+        container.upsert_item(document(number))
+    db = make_database(container, str(tmp_path))
+    db.ensure_index()
+
+    assert len(db.ann_index.centroids) > 0
+    assert nearest(db, 3) == ["doc-3"]
+
+
+def test_sync_retrains_after_large_growth():
+    container = LocalContainer([document(number) for number in range(16)])
+    db = make_database(container)
+    db.ensure_index()
+    trained = db.ann_index.centroids
+
+    container.upsert_item(document(16))
+    db.sync(persist=False)
+    assert db.ann_index.centroids is trained
+
+    for number in range(17, 64):
+        container.upsert_item(document(number))
+    db.sync(persist=False)
+    assert db.ann_index.centroids is not trained
+    assert db.ann_index.trained_rows == 64
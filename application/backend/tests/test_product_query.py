@@ -0,0 +1,23 @@
+import json
+import sqlite3
+
+from application.backend.chatbot.product_query import lookup_parts, serialize_rows
+
+
+def test_null_columns_are_reported_not_dropped_silently():
+    result = json.loads(serialize_rows(["Part_No", "Core", "Max_Speed"],
+                                       [("M032LG8AE", "Cortex-M0", None), ("M031", "Cortex-M0", None)], False))
+
+    assert result["columns"] == ["Part_No", "Core"]
+    assert result["rows"] == [["M032LG8AE", "Cortex-M0"], ["M031", "Cortex-M0"]]
+    assert result["omitted_null_columns"] == ["Max_Speed"]
+
+
+def test_lookup_of_an_unavailable_parameter():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE products (Part_No TEXT, Core TEXT, Application TEXT)")
+    conn.execute("INSERT INTO products VALUES ('M032LG8AE', 'Cortex-M0', NULL)")
+
+    result = json.loads(lookup_parts(conn, ["M032LG8AE"], ["Core", "Application"], table_name="products"))
+    assert result["columns"] == ["Part_No", "Core"]
+    assert result["omitted_null_columns"] == ["Application"]
@@ -0,0 +1,40 @@
+import json
+import os
+
+from application.backend.datastore.bm25 import BM25Index
+from application.backend.datastore.db import SNAPSHOT_METADATA, ChatbotVectorDatabase, LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+
+
+def make_database(container, snapshot_dir):
+    return ChatbotVectorDatabase(container=container, openai_client=object(), snapshot_dir=snapshot_dir,
+                                 embedding_cache=EmbeddingCache(path=None))
+
+
+def lexical_ids(db, query):
+    return [doc["id"] for doc in db.search(query, top_k=3, mode="lexical")]
+
+
+def test_lexical_index_is_versioned_with_the_snapshot(tmp_path, monkeypatch):
+    container = LocalContainer([
+        {"id": "a", "text": "configure shipping carriers", "text_embedding": [1.0, 0.0]},
+        {"id": "b", "text": "install a payment module", "text_embedding": [0.0, 1.0]},
+    ])
+    make_database(container, str(tmp_path)).ensure_index()
+
+    container.upsert_item({"id": "c", "text": "import the product catalog", "text_embedding": [1.0, 1.0]})
+    container.delete_item("a")
+    writer = make_database(container, str(tmp_path))
+    writer.ensure_index()
+    assert lexical_ids(writer, "catalog") == ["c"]
+
+    with open(os.path.join(tmp_path, SNAPSHOT_METADATA), encoding="utf-8") as f:
+        metadata = json.load(f)
+    assert sorted(p for p in os.listdir(tmp_path) if p.startswith("lexical-")) == [metadata["bm25"]]
+
+    # A fresh reader takes the lexical index from the snapshot instead of rebuilding it
+    monkeypatch.setattr(ChatbotVectorDatabase, "build_bm25", staticmethod(lambda documents: BM25Index()))
+    reader = make_database(container, str(tmp_path))
+    assert reader.load_snapshot()
+    assert lexical_ids(reader, "catalog") == ["c"]
+    assert lexical_ids(reader, "shipping") == []
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from application.backend.chatbot.sql_guard import SqlGuard, SqlRejected, _authorize
+
+
+def make_connection(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE products (Part_No TEXT, Core TEXT)")
+    conn.execute("CREATE VIRTUAL TABLE product_search USING fts5(Core)")
+    conn.execute("INSERT INTO products VALUES ('M2351', 'Cortex-M23')")
+    conn.execute("INSERT INTO product_search (rowid, Core) VALUES (1, 'Cortex-M23')")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path)
+    # Connects the FTS5 table before any authorizer is installed, as ProductStore does
+    conn.execute("SELECT 1 FROM product_search LIMIT 0")
+    return conn
+
+
+def test_authorizer_denies_writes(tmp_path):
+    conn = make_connection(str(tmp_path / "products.db"))
+    guard = SqlGuard()
+
+    for statement in ("UPDATE products SET Core = 'x'", "DELETE FROM product_search",
+                      "CREATE TABLE copy AS SELECT * FROM products"):
+        with pytest.raises(sqlite3.DatabaseError, match="not authorized"):
+            with guard.budget(conn):
+                conn.execute(statement)
+    assert conn.execute("SELECT Core FROM products").fetchall() == [("Cortex-M23",)]
+    assert _authorize(sqlite3.SQLITE_UPDATE, "sqlite_master", "sql", "main", None) == sqlite3.SQLITE_DENY
+
+
+def test_full_text_search_runs_under_the_guard(tmp_path):
+    conn = make_connection(str(tmp_path / "products.db"))
+    guard = SqlGuard()
+
+    sql = guard.prepare(conn, "SELECT rowid FROM product_search WHERE product_search MATCH 'cortex'", 10)
+    with guard.budget(conn):
+        assert conn.execute(sql).fetchall() == [(1,)]
+    with pytest.raises(SqlRejected):
+        guard.prepare(conn, "DELETE FROM products", 10)
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+from application.backend.datastore.db import ChatbotVectorDatabase, LocalContainer
+from application.backend.datastore.embedding_cache import EmbeddingCache
+
+
+def document(number, version=0):
+    vector = np.random.default_rng(number * 1000 + version).standard_normal(8)
+    return {"id": f"doc-{number}", "text": f"chunk {number} version {version}", "version": version,
+            "text_embedding": vector.tolist()}
+
+
+def make_database(container, snapshot_dir=None, index_mode="exact"):
+    return ChatbotVectorDatabase(container=container, openai_client=object(), snapshot_dir=snapshot_dir,
+                                 index_mode=index_mode, embedding_cache=EmbeddingCache(path=None))
+
+
+def test_sync_publishes_a_new_version_and_leaves_the_old_one_intact(tmp_path):
+    container = LocalContainer([document(number) for number in range(10)])
+    db = make_database(container, str(tmp_path))
+    db.ensure_index()
+    old = db.resident
+    old_matrix = np.array(old.matrix)
+
+    container.upsert_item(document(3, version=1))
+    container.delete_item("doc-5")
+    container.upsert_item(document(10))
+    assert db.sync() == {"updated": 1, "added": 1, "removed": 1}
+
+    assert db.resident is not old
+    assert np.array_equal(old.matrix, old_matrix)
+    assert old.documents[3]["version"] == 0
+    assert "doc-5" in old.bm25.documents and "doc-10" not in old.bm25.documents
+    assert db.documents[db.positions["doc-3"]]["version"] == 1
+    assert "doc-5" not in db.positions and "doc-10" in db.bm25.documents
+
+
+def test_searches_stay_consistent_while_syncing():
+    container = LocalContainer([document(number) for number in range(50)])
+    db = make_database(container, index_mode="ivf")
+    db.ensure_index()
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            index = db.resident
+            try:
+                for number in range(0, 60, 7):
+                    query = np.asarray(document(number)["text_embedding"], dtype=np.float32)
+                    rows = db.vector_ranking(query, 5, nprobe=4, index=index)
+                    assert all(row < len(index.documents) for row in rows)
+                    hits = db.rank(f"chunk {number}", query, 5, nprobe=4, mode="hybrid")
+                    assert len({doc["id"] for doc in hits}) == len(hits)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for version in range(1, 15):
+        for number in range(version, 50 + version, 3):
+            container.upsert_item(document(number, version))
+        container.delete_item(f"doc-{version - 1}")
+        db.sync(persist=False)
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert len(db.documents) == len(db.embedding_matrix) == db.ann_index.size == len(db.bm25)
@@ -1,16 +1,16 @@
 // src/api/chatbotApi.js
-export async function fetchChatStream(question, conversation) {
+export async function fetchChatStream(question, sessionId) {
     /**
      * 發送 POST，取得 SSE (text/event-stream) 
      *
      * question: (string) 輸入的問題
-     * conversation: (List) [{sender, content}, ...]
+     * sessionId: (string) 對話 ID，後端依此保存對話狀態
      */
     const url = "http://localhost:8000/chat_stream"; 
-    // 送出請求
+    // 送出請求：只傳新訊息，歷史對話由後端 session 保存
     const bodyData = {
-      question,
-      conversation, // 傳遞列表
+      session_id: sessionId,
+      message: question,
     };
   
     const response = await fetch(url, {
@@ -13,6 +13,7 @@ const ChatContainer = ({conversation, onUpdateMessages}) => {
     const typingTimeoutRef = useRef(null);
     const streamBaseRef = useRef({});
     const streamChainRef = useRef({});
+    const deltaTextRef = useRef({});
 
     const TYPING_SPEED = 17;
     const TYPING_SPEED_FINAL = 5;
@@ -112,6 +113,7 @@ const ChatContainer = ({conversation, onUpdateMessages}) => {
         const assistantMsgId = uuidv4();
         streamBaseRef.current[assistantMsgId] = "";
         streamChainRef.current[assistantMsgId] = Promise.resolve();
+        deltaTextRef.current[assistantMsgId] = "";
         const assistantMsg = {
             sender: "assistant",
             id: assistantMsgId,
@@ -129,7 +131,7 @@ const ChatContainer = ({conversation, onUpdateMessages}) => {
         setUserInput("");
 
         try {
-            const reader = await fetchChatStream(userInput, updatedMessages);
+            const reader = await fetchChatStream(userInput, conversation.id);
             let buffer = "";
             const processChunk = async () => {
                 const {done, value} = await reader.read();
@@ -154,9 +156,35 @@ const ChatContainer = ({conversation, onUpdateMessages}) => {
                                 streamChainRef.current[assistantMsgId].then(() =>
                                     typeOutStreamChunk(newLine, assistantMsgId)
                                 );
+                        } else if (parsed.type === "delta") {
+                            // 最終答案的 token 直接附加顯示，不再逐字打字
+                            deltaTextRef.current[assistantMsgId] += parsed.data;
+                            const deltaText = cleanMarkdown(deltaTextRef.current[assistantMsgId]);
+                            streamChainRef.current[assistantMsgId] =
+                                streamChainRef.current[assistantMsgId].then(() =>
+                                    updateAssistantMessage(assistantMsgId, (msg) => ({
+                                        ...msg,
+                                        thinking: false,
+                                        finalStatus: "typing",
+                                        final: deltaText,
+                                        content: deltaText,
+                                    }))
+                                );
                         } else if (parsed.type === "final") {
                             streamChainRef.current[assistantMsgId] =
                                 streamChainRef.current[assistantMsgId].then(() => {
+                                    if (deltaTextRef.current[assistantMsgId]) {
+                                        // 已經透過 delta 顯示過，直接替換為完整答案
+                                        const finalText = cleanMarkdown(parsed.data || deltaTextRef.current[assistantMsgId]);
+                                        updateAssistantMessage(assistantMsgId, (msg) => ({
+                                            ...msg,
+                                            thinking: false,
+                                            final: finalText,
+                                            content: finalText,
+                                            finalStatus: "final",
+                                        }));
+                                        return;
+                                    }
                                     updateAssistantMessage(assistantMsgId, (msg) => ({
                                         ...msg,
                                         thinking: false,